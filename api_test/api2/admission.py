@@ -0,0 +1,135 @@
+import functools
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+import config
+import metrics
+
+ADMISSION_IN_FLIGHT = metrics.REGISTRY.gauge(
+    "admission_in_flight", "Requests admitted and running, by controller", ("controller",))
+ADMISSION_QUEUE_DEPTH = metrics.REGISTRY.gauge(
+    "admission_queue_depth", "Requests waiting for admission, by controller", ("controller",))
+ADMISSION_REJECTED = metrics.REGISTRY.counter(
+    "admission_rejected_total", "Requests rejected by admission control, by controller and reason",
+    ("controller", "reason"))
+ADMISSION_QUEUE_WAIT = metrics.REGISTRY.histogram(
+    "admission_queue_wait_seconds", "Time admitted requests spent queued, by controller", ("controller",))
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is not admitted; retry_after is a hint in whole seconds"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("event", "admitted")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.admitted = False
+
+
+class AdmissionController:
+    """
+    Concurrency limit with a bounded FIFO wait queue for upstream-heavy work.
+
+    Up to `max_concurrent` requests run at once; the next `max_queue` wait in
+    arrival order for at most `queue_timeout` seconds. Anything beyond that is
+    rejected at once with AdmissionRejected, so under overload the requests
+    that are admitted still finish in time instead of every request slowing
+    down together. A released slot is handed directly to the oldest waiter.
+    """
+
+    def __init__(self, name, max_concurrent=None, max_queue=None, queue_timeout=None, clock=time.monotonic):
+        self.name = name
+        self.max_concurrent = max_concurrent or config.ADMISSION_MAX_CONCURRENT
+        self.max_queue = config.ADMISSION_MAX_QUEUE if max_queue is None else max_queue
+        self.queue_timeout = config.ADMISSION_QUEUE_TIMEOUT if queue_timeout is None else queue_timeout
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._waiters = deque()
+        self.active = 0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        # Media móvil del tiempo de servicio, para estimar Retry-After
+        self.service_time = 1.0
+        ADMISSION_IN_FLIGHT.labels(name).set_function(lambda: self.active)
+        ADMISSION_QUEUE_DEPTH.labels(name).set_function(lambda: len(self._waiters))
+
+    def retry_after(self):
+        """Seconds until a slot is likely free for a new request"""
+        backlog = len(self._waiters) + 1
+        return max(1, math.ceil(self.service_time * backlog / self.max_concurrent))
+
+    def acquire(self):
+        """Take a slot, waiting in the queue if needed; raise AdmissionRejected otherwise"""
+        with self._lock:
+            if self.active < self.max_concurrent and not self._waiters:
+                self.active += 1
+                self.admitted += 1
+                return
+            if len(self._waiters) >= self.max_queue:
+                self.rejected_queue_full += 1
+                ADMISSION_REJECTED.labels(self.name, "queue_full").inc()
+                raise AdmissionRejected(f"Server busy: {self.name} queue full", self.retry_after())
+            waiter = _Waiter()
+            self._waiters.append(waiter)
+
+        started = self.clock()
+        waiter.event.wait(self.queue_timeout)
+        with self._lock:
+            if not waiter.admitted:
+                self._waiters.remove(waiter)
+                self.rejected_timeout += 1
+                ADMISSION_REJECTED.labels(self.name, "queue_timeout").inc()
+                raise AdmissionRejected(f"Server busy: {self.name} queue wait exceeded", self.retry_after())
+        ADMISSION_QUEUE_WAIT.labels(self.name).observe(self.clock() - started)
+
+    def release(self, service_time=None):
+        with self._lock:
+            if service_time is not None:
+                self.service_time += 0.2 * (service_time - self.service_time)
+            if self._waiters:
+                # El hueco pasa directamente al primero de la cola: active no cambia
+                waiter = self._waiters.popleft()
+                waiter.admitted = True
+                self.admitted += 1
+                waiter.event.set()
+            else:
+                self.active -= 1
+
+    @contextmanager
+    def admit(self):
+        self.acquire()
+        started = self.clock()
+        try:
+            yield
+        finally:
+            self.release(self.clock() - started)
+
+    def limit(self, func):
+        """Decorator running every call of func under admission control"""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with self.admit():
+                return func(*args, **kwargs)
+        return wrapper
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "active": self.active,
+                "queued": len(self._waiters),
+                "admitted": self.admitted,
+                "rejected_queue_full": self.rejected_queue_full,
+                "rejected_timeout": self.rejected_timeout,
+                "service_time": round(self.service_time, 3),
+            }
@@ -0,0 +1,105 @@
+from functools import reduce
+from . import models
+
+# Masks are stored in signed 64-bit columns
+MAX_QUESTIONS_PER_SET = 63
+
+
+def pack_answers(question_ids, responses):
+    """
+    Pack {question_id: bool} into (answers_mask, answered_mask) for a question set.
+
+    Bit i of answered_mask is set when question_ids[i] was answered, and bit i
+    of answers_mask when the answer was Yes. Unknown question ids raise ValueError.
+    """
+    positions = {question_id: bit for bit, question_id in enumerate(question_ids)}
+    answers_mask = answered_mask = 0
+    for question_id, answer in responses.items():
+        bit = positions.get(int(question_id))
+        if bit is None:
+            raise ValueError(f"Question {question_id} is not part of the question set")
+        answered_mask |= 1 << bit
+        if answer:
+            answers_mask |= 1 << bit
+    return answers_mask, answered_mask
+
+
+def unpack_answers(question_ids, answers_mask, answered_mask):
+    """Return the {question_id: bool} answers packed in a pair of masks"""
+    return {
+        question_id: bool(answers_mask >> bit & 1)
+        for bit, question_id in enumerate(question_ids)
+        if answered_mask >> bit & 1
+    }
+
+
+def mask_question_ids(question_ids, mask):
+    """Return the question ids whose bits are set in mask"""
+    return [question_id for bit, question_id in enumerate(question_ids) if mask >> bit & 1]
+
+
+def current_question_set(db_session):
+    """
+    Return the question set of the questions table, creating a new version whenever
+    its question ids differ from the latest set (or no set exists yet).
+
+    Raises ValueError if the questions table holds more than MAX_QUESTIONS_PER_SET questions.
+    """
+    question_ids = [question_id for question_id, in db_session.query(models.Question.id).order_by(models.Question.id)]
+    question_set = db_session.query(models.QuestionSet).order_by(models.QuestionSet.id.desc()).first()
+    if question_set is None or question_set.get_question_ids() != question_ids:
+        question_set = create_question_set(db_session, question_ids)
+    return question_set
+
+
+def create_question_set(db_session, question_ids):
+    """Store a new question set version for these questions"""
+    question_ids = list(question_ids)
+    if len(question_ids) > MAX_QUESTIONS_PER_SET:
+        raise ValueError(f"A question set holds at most {MAX_QUESTIONS_PER_SET} questions")
+    question_set = models.QuestionSet()
+    question_set.set_question_ids(question_ids)
+    db_session.add(question_set)
+    db_session.commit()
+    return question_set
+
+
+def unanimous_yes_question_ids(db_session, participant_ids):
+    """
+    Return the ids of the questions every participant answered Yes.
+
+    Loads one ResponseVector per participant and intersects their Yes masks
+    with a bitwise AND; a participant without answers makes the result empty.
+    Vectors of older question set versions are remapped onto the newest one.
+    """
+    if not participant_ids:
+        return []
+    vectors = db_session.query(
+        models.ResponseVector.question_set_version,
+        models.ResponseVector.answers_mask,
+        models.ResponseVector.answered_mask
+    ).filter(models.ResponseVector.participant_id.in_(participant_ids)).all()
+    if len(vectors) < len(participant_ids):
+        return []
+
+    versions = {version for version, _, _ in vectors}
+    question_sets = {
+        question_set.id: question_set.get_question_ids()
+        for question_set in db_session.query(models.QuestionSet).filter(models.QuestionSet.id.in_(versions))
+    }
+    target = max(versions)
+    target_ids = question_sets[target]
+    if len(versions) > 1:
+        # Versiones distintas: se traduce cada máscara a la versión más reciente
+        positions = {question_id: bit for bit, question_id in enumerate(target_ids)}
+        yes_masks = []
+        for version, answers_mask, answered_mask in vectors:
+            mask = 0
+            for question_id in mask_question_ids(question_sets[version], answers_mask & answered_mask):
+                if question_id in positions:
+                    mask |= 1 << positions[question_id]
+            yes_masks.append(mask)
+    else:
+        yes_masks = [answers_mask & answered_mask for _, answers_mask, answered_mask in vectors]
+
+    return mask_question_ids(target_ids, reduce(lambda left, right: left & right, yes_masks))
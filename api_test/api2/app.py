@@ -1,15 +1,114 @@
-from flask import Flask, request, jsonify
+import importlib
+import importlib.util
+import os
+import re
+import sys
+import time
+from flask import Flask, request, jsonify, url_for, redirect, g
 from skyscanner_api import SkyscannerApiClient  # Cambiamos el import relativo a absoluto
+from search_cache import SearchCache
+from price_matrix import date_window
+from polling import parse_deadline, parse_passengers
+from cache_warmer import CacheWarmer, RecentSearches
+from search_jobs import SearchJobManager, JobQueueFull
+from async_skyscanner_api import AsyncSkyscannerApiClient
+import sse_server
+import metrics
+from admission import AdmissionController, AdmissionRejected
+from qr_service import get_qr_service, CONTENT_TYPES, QRRenderTimeout
+import config
 import logging
 
 app = Flask(__name__)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Create an instance of the Skyscanner API client
-skyscanner_client = SkyscannerApiClient()
+# Create an instance of the Skyscanner API client, with shared search and price caches
+search_cache = SearchCache()
+indicative_cache = SearchCache(ttl=config.INDICATIVE_CACHE_TTL, max_entries=config.INDICATIVE_CACHE_MAX_ENTRIES)
+skyscanner_client = SkyscannerApiClient(cache=search_cache, indicative_cache=indicative_cache)
+
+def load_database_package():
+    """
+    Import the database modules (database, recommendation_engine) of this directory.
+
+    They use relative imports, so they are imported as a package named after
+    this directory; `python app.py` only puts this directory on sys.path, so
+    its parent is added when the package is not importable yet. Returns
+    (get_session, close_session, RecommendationEngine), or None if a
+    dependency such as SQLAlchemy is missing.
+    """
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    package = os.path.basename(package_dir)
+    if importlib.util.find_spec(package) is None:
+        sys.path.append(os.path.dirname(package_dir))
+    try:
+        database = importlib.import_module(f"{package}.database")
+        recommendation_engine = importlib.import_module(f"{package}.recommendation_engine")
+    except ImportError as e:
+        logger.warning(f"Base de datos no disponible ({e}): el precalentamiento usa solo las búsquedas recientes")
+        return None
+    return database.get_session, database.close_session, recommendation_engine.RecommendationEngine
+
+database_package = load_database_package()
+
+def recommended_routes():
+    """Recently recommended destinations, then every Destination with an IATA code"""
+    get_session, close_session, RecommendationEngine = database_package
+    db_session = get_session()
+    try:
+        return RecommendationEngine(db_session, skyscanner_client).popular_routes()
+    finally:
+        close_session(db_session)
+
+# Background warming of popular routes, driven by recent /api/search traffic
+# and by the destinations of the database (recent recommendations first)
+recent_searches = RecentSearches()
+route_sources = [recent_searches.top_routes]
+if database_package is not None:
+    route_sources.append(recommended_routes)
+cache_warmer = CacheWarmer(
+    skyscanner_client,
+    route_sources,
+    is_busy=lambda: (skyscanner_client.singleflight.in_flight() > 0
+                     or recent_searches.idle_for() < config.CACHE_WARMER_IDLE_SECONDS)
+)
+
+metrics.register_cache("search", search_cache)
+metrics.register_cache("indicative", indicative_cache)
+
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    metrics.HTTP_IN_FLIGHT.inc()
+
+@app.after_request
+def record_request_metrics(response):
+    route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    metrics.HTTP_REQUEST_DURATION.labels(request.method, route).observe(time.perf_counter() - g.request_started)
+    metrics.HTTP_REQUESTS.labels(request.method, route, str(response.status_code)).inc()
+    return response
+
+@app.teardown_request
+def finish_request_metrics(error=None):
+    if 'request_started' in g:
+        metrics.HTTP_IN_FLIGHT.dec()
+
+# Backpressure: upstream-heavy routes share a concurrency limit with a bounded queue
+upstream_admission = AdmissionController("upstream")
+
+@app.errorhandler(AdmissionRejected)
+def reject_overload(error):
+    response = jsonify({"error": str(error)})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+# Background search jobs for clients that fetch progress later
+search_jobs = SearchJobManager(skyscanner_client)
 
 @app.route('/api/search', methods=['POST'])
+@upstream_admission.limit
 def search_flights():
     """
     Search for flights using the Skyscanner API
@@ -19,8 +118,15 @@ def search_flights():
         "destination": "BCN",
         "date": "2023-12-25",
         "adults": 2,
-        "children_ages": [5, 7]  // optional
+        "children_ages": [5, 7],  // optional
+        "deadline": 8,            // optional, seconds (at most SEARCH_MAX_DEADLINE)
+        "async": true             // optional, see below
     }
+    With "async": true (or a "Prefer: respond-async" header) the search runs
+    as a background job: the response is 202 with a job id, and progress is
+    read from GET /api/search/<job_id>.
+    In stale-while-revalidate mode, cached results past their TTL are returned
+    immediately (X-Cache: STALE, Age header) while they are refreshed.
     """
     try:
         data = request.json
@@ -36,14 +142,50 @@ def search_flights():
         # Validate required parameters
         if not all([origin, destination, date]):
             return jsonify({"error": "Missing required parameters"}), 400
+        try:
+            deadline = parse_deadline(data.get('deadline'))
+            adults, children_ages = parse_passengers(adults, children_ages)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        recent_searches.record(origin=origin, destination=destination, date=date,
+                               adults=adults, children_ages=children_ages)
+        
+        if data.get('async') or 'respond-async' in request.headers.get('Prefer', ''):
+            try:
+                job = search_jobs.submit(origin, destination, date, deadline=deadline,
+                                         adults=adults, children_ages=children_ages)
+            except JobQueueFull as e:
+                return jsonify({"error": str(e)}), 503
+            
+            status_url = url_for('get_search_job', job_id=job.id)
+            response = jsonify({"job_id": job.id, "status": job.status, "status_url": status_url})
+            response.status_code = 202
+            response.headers['Location'] = status_url
+            return response
         
         # Call the API client
+        if config.SEARCH_SERVING_MODE == "stale-while-revalidate":
+            result, cache_status, age = skyscanner_client.serve_search(
+                origin=origin,
+                destination=destination,
+                date=date,
+                adults=adults,
+                children_ages=children_ages,
+                deadline=deadline
+            )
+            response = jsonify(result)
+            response.headers['X-Cache'] = cache_status
+            response.headers['Age'] = str(int(age))
+            return response
+        
         result = skyscanner_client.complete_search(
             origin=origin,
             destination=destination,
             date=date,
             adults=adults,
-            children_ages=children_ages
+            children_ages=children_ages,
+            deadline=deadline
         )
         
         return jsonify(result)
@@ -52,6 +194,203 @@ def search_flights():
         logger.error(f"Error in search_flights: {str(e)}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/search/stream', methods=['GET'])
+def stream_search():
+    """
+    Live search over Server-Sent Events, served by the asyncio SSE server
+    (sse_server.py) so open streams don't hold Flask worker threads.
+    Query string: origin, destination, date, adults, children_ages (comma
+    separated), deadline. Redirects to the SSE server with the same query.
+    """
+    host = request.host.rsplit(':', 1)[0]
+    return redirect(f"{request.scheme}://{host}:{config.SSE_PORT}{sse_server.STREAM_PATH}"
+                    f"?{request.query_string.decode()}", code=307)
+
+@app.route('/api/search/<job_id>', methods=['GET'])
+def get_search_job(job_id):
+    """
+    Get the status of a search job: partial itineraries while it runs,
+    then the final result (or its error). Finished jobs expire after
+    SEARCH_JOB_TTL seconds.
+    """
+    job = search_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Search job not found or expired"}), 404
+    return jsonify(job.snapshot())
+
+@app.route('/api/search/calendar', methods=['POST'])
+@upstream_admission.limit
+def search_cheapest_days():
+    """
+    Find the cheapest departure days of a route within a date window
+    Expected JSON payload:
+    {
+        "origin": "MAD",
+        "destination": "BCN",
+        "start_date": "2023-12-01",
+        "end_date": "2023-12-31",
+        "confirm": 3,   // optional, days confirmed with a live search
+        "adults": 1     // optional
+    }
+    """
+    try:
+        data = request.json
+        origin = data.get('origin')
+        destination = data.get('destination')
+        start_date = data.get('start_date')
+        end_date = data.get('end_date')
+        confirm = data.get('confirm', config.CALENDAR_LIVE_CONFIRM)
+        adults = data.get('adults', 1)
+        
+        if not all([origin, destination, start_date, end_date]):
+            return jsonify({"error": "Missing required parameters"}), 400
+        if isinstance(confirm, bool) or not isinstance(confirm, int) or confirm < 0:
+            return jsonify({"error": "confirm must be a non-negative integer"}), 400
+        adults, _ = parse_passengers(adults)
+        
+        days = len(date_window(start_date, end_date))
+        if days < 1 or days > config.INDICATIVE_MAX_DAYS:
+            return jsonify({"error": f"Date window must span 1 to {config.INDICATIVE_MAX_DAYS} days"}), 400
+        
+        result = skyscanner_client.cheapest_days(
+            origin, destination, start_date, end_date,
+            confirm=min(confirm, config.CALENDAR_LIVE_CONFIRM),
+            adults=adults
+        )
+        return jsonify(result)
+    
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in search_cheapest_days: {str(e)}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/search/batch', methods=['POST'])
+@upstream_admission.limit
+def search_batch():
+    """
+    Run several flight searches concurrently and return all results at once
+    Expected JSON payload:
+    {
+        "queries": [
+            {"origin": "MAD", "destination": "BCN", "date": "2023-12-25", "adults": 2},
+            {"origin": "MAD", "destination": "LIS", "date": "2023-12-25"}
+        ],
+        "deadline": 10,       // optional, seconds shared by the whole batch (at most SEARCH_MAX_DEADLINE)
+        "max_concurrency": 4  // optional
+    }
+    Identical queries are searched once. Each entry of "results" holds the
+    query and either its "result" or its "error".
+    """
+    try:
+        data = request.json
+        queries = data.get('queries')
+        
+        if not queries or not isinstance(queries, list):
+            return jsonify({"error": "Missing required parameters"}), 400
+        if len(queries) > config.BATCH_SEARCH_MAX_QUERIES:
+            return jsonify({"error": f"At most {config.BATCH_SEARCH_MAX_QUERIES} queries per batch"}), 400
+        
+        # Una consulta inválida solo invalida su propia entrada
+        entries = []
+        routes = []
+        for query in queries:
+            if not isinstance(query, dict):
+                entries.append({"query": query, "error": "Query must be an object"})
+                continue
+            if not all(isinstance(query.get(name), str) and query.get(name)
+                       for name in ('origin', 'destination', 'date')):
+                entries.append({"query": query, "error": "Missing required parameters"})
+                continue
+            try:
+                adults, children_ages = parse_passengers(query.get('adults'), query.get('children_ages'))
+            except ValueError as e:
+                entries.append({"query": query, "error": str(e)})
+                continue
+            route = {
+                "origin": query['origin'],
+                "destination": query['destination'],
+                "date": query['date'],
+                "adults": adults,
+            }
+            if children_ages:
+                route["children_ages"] = children_ages
+            entries.append({"query": route})
+            routes.append(route)
+            recent_searches.record(**route)
+        
+        try:
+            deadline = parse_deadline(data.get('deadline'), default=config.BATCH_SEARCH_DEADLINE)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        max_concurrency = data.get('max_concurrency', config.BATCH_SEARCH_CONCURRENCY)
+        if isinstance(max_concurrency, bool) or not isinstance(max_concurrency, int) or max_concurrency < 1:
+            return jsonify({"error": "max_concurrency must be a positive integer"}), 400
+        max_concurrency = min(max_concurrency, config.BATCH_SEARCH_CONCURRENCY)
+        results = iter(skyscanner_client.search_many(routes, deadline=deadline, max_concurrency=max_concurrency)
+                       if routes else ())
+        
+        for entry in entries:
+            if "error" not in entry:
+                result = next(results)
+                if "error" in result:
+                    entry["error"] = result["error"]
+                else:
+                    entry["result"] = result
+        return jsonify({
+            "results": entries,
+            "errors": sum(1 for entry in entries if "error" in entry)
+        })
+    
+    except Exception as e:
+        logger.error(f"Error in search_batch: {str(e)}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+# Airport and city codes: three letters
+IATA_CODE_PATTERN = re.compile("[A-Za-z]{3}")
+
+@app.route('/api/prices/matrix', methods=['POST'])
+@upstream_admission.limit
+def get_price_matrix():
+    """
+    Get indicative prices for several origins, destinations and a date window
+    Expected JSON payload:
+    {
+        "origins": ["MAD", "BCN"],
+        "destinations": ["CDG", "FCO", "LIS"],
+        "start_date": "2023-12-01",
+        "end_date": "2023-12-31"
+    }
+    """
+    try:
+        data = request.json
+        origins = data.get('origins')
+        destinations = data.get('destinations')
+        start_date = data.get('start_date')
+        end_date = data.get('end_date')
+        
+        if not all([origins, destinations, start_date, end_date]):
+            return jsonify({"error": "Missing required parameters"}), 400
+        for name, codes in (("origins", origins), ("destinations", destinations)):
+            if not isinstance(codes, list) or not all(
+                    isinstance(code, str) and IATA_CODE_PATTERN.fullmatch(code) for code in codes):
+                return jsonify({"error": f"{name} must be a non-empty list of IATA codes"}), 400
+        
+        days = len(date_window(start_date, end_date))
+        if days < 1 or days > config.INDICATIVE_MAX_DAYS:
+            return jsonify({"error": f"Date window must span 1 to {config.INDICATIVE_MAX_DAYS} days"}), 400
+        if len(origins) * len(destinations) > config.INDICATIVE_MAX_ROUTES:
+            return jsonify({"error": f"At most {config.INDICATIVE_MAX_ROUTES} routes per request"}), 400
+        
+        result = skyscanner_client.indicative_price_matrix(origins, destinations, start_date, end_date)
+        return jsonify(result)
+    
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in get_price_matrix: {str(e)}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/destination/<iata_code>', methods=['GET'])
 def get_destination(iata_code):
     """
@@ -64,5 +403,81 @@ def get_destination(iata_code):
         logger.error(f"Error in get_destination: {str(e)}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
+# Room codes: ROOM_CODE_LENGTH characters of room_codes.ALPHABET (A-Z, 0-9)
+ROOM_CODE_PATTERN = re.compile(f"[A-Z0-9]{{{config.ROOM_CODE_LENGTH}}}")
+
+@app.route('/api/rooms/<room_code>/qr', methods=['GET'])
+def get_room_qr_code(room_code):
+    """
+    Get the invitation QR code of a room as an image
+    Query parameters: format ("png" or "svg", default png), size (pixels
+    per module, default QR_DEFAULT_BOX_SIZE). Images are cached by content
+    and served with long-lived cache headers and an ETag. Codes must be
+    ROOM_CODE_LENGTH letters or digits.
+    """
+    try:
+        room_code = room_code.upper()
+        if not ROOM_CODE_PATTERN.fullmatch(room_code):
+            return jsonify({"error": "Invalid room code"}), 400
+        fmt = request.args.get('format', 'png').lower()
+        size = request.args.get('size', config.QR_DEFAULT_BOX_SIZE, type=int)
+        join_url = f"{config.JOIN_BASE_URL}{room_code}"
+        
+        image, etag = get_qr_service().render(join_url, size, fmt)
+        response = app.response_class(image, mimetype=CONTENT_TYPES[fmt])
+        response.set_etag(etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = config.QR_HTTP_MAX_AGE
+        return response.make_conditional(request)
+    
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except QRRenderTimeout as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        logger.error(f"Error in get_room_qr_code: {str(e)}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """
+    Get hit/miss/eviction counters of the flight search cache
+    """
+    return jsonify({
+        "search": search_cache.stats(),
+        "indicative": indicative_cache.stats(),
+        "coalescing": skyscanner_client.singleflight.stats(),
+        "revalidation": skyscanner_client.revalidation_stats(),
+        "jobs": search_jobs.stats(),
+        "qr": get_qr_service().stats(),
+        "warmer": cache_warmer.stats()
+    })
+
+@app.route('/api/upstream/stats', methods=['GET'])
+def get_upstream_stats():
+    """
+    Get rate limiter, circuit breaker and admission control metrics for the Skyscanner API key
+    """
+    return jsonify({
+        "rate_limiter": skyscanner_client.rate_limiter.stats(),
+        "circuit_breaker": skyscanner_client.circuit_breaker.stats(),
+        "admission": upstream_admission.stats()
+    })
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Request, upstream and cache metrics in the Prometheus text format
+    """
+    return metrics.REGISTRY.render(), 200, {'Content-Type': metrics.CONTENT_TYPE}
+
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    debug = True
+    # Con debug, el reloader ejecuta este bloque también en el proceso padre, que
+    # solo vigila los ficheros: los hilos de fondo arrancan en el proceso que sirve
+    if not debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        if config.CACHE_WARMER_ENABLED:
+            cache_warmer.start()
+        if config.SSE_ENABLED:
+            sse_server.start_in_thread(AsyncSkyscannerApiClient(skyscanner_client))
+    app.run(debug=debug, host='0.0.0.0', port=5000)
@@ -0,0 +1,263 @@
+import asyncio
+import logging
+import config
+from skyscanner_api import SkyscannerApiClient
+from polling import PollingStrategy, STATUS_INCOMPLETE
+from search_state import SearchState
+from search_cache import make_search_key
+from metrics import SEARCH_POLLS
+from singleflight import SingleFlightTimeout, wait_async
+
+logger = logging.getLogger(__name__)
+
+
+def results_batch(results):
+    """Shape complete results like a single SearchState.batch"""
+    state = SearchState()
+    state.merge(results)
+    return state.batch(0)
+
+
+class AsyncSkyscannerApiClient:
+    """
+    Asyncio flavour of SkyscannerApiClient.
+
+    The HTTP calls reuse the pooled session of the synchronous client and run
+    on the default executor, so no extra HTTP dependency is needed; the waits
+    between polls happen on the event loop, which lets many create+poll cycles
+    share one loop.
+    """
+
+    def __init__(self, sync_client=None, max_in_flight=None):
+        self.sync_client = sync_client or SkyscannerApiClient()
+        self.max_in_flight = max_in_flight or config.ASYNC_MAX_IN_FLIGHT
+        self._semaphore = None
+
+    def _get_semaphore(self):
+        # El semáforo se crea dentro del bucle de eventos que lo va a usar
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        return self._semaphore
+
+    async def _call(self, func, *args, **kwargs):
+        async with self._get_semaphore():
+            return await asyncio.to_thread(func, *args, **kwargs)
+
+    async def search_flights(self, origin, destination, date, **kwargs):
+        """
+        Search for flights using the Skyscanner API
+        """
+        return await self._call(self.sync_client.search_flights, origin, destination, date, **kwargs)
+
+    async def get_indicative_prices(self, origin, destination, start_date, end_date, **kwargs):
+        """
+        Get indicative prices for every day between two dates in one request
+        """
+        return await self._call(
+            self.sync_client.get_indicative_prices, origin, destination, start_date, end_date, **kwargs
+        )
+
+    async def poll_search_results(self, session_token, timeout=None):
+        """
+        Poll for search results (a LazySearchResponse, or an error dict)
+        """
+        return await self._call(self.sync_client.poll_search_results, session_token, timeout=timeout, lazy=True)
+
+    async def _aiter_states(self, origin, destination, date, deadline=None, **kwargs):
+        """
+        Run a live search and yield its SearchState after the create and every poll
+        """
+        strategy = PollingStrategy(deadline=deadline)
+        search_response = await self.search_flights(origin, destination, date, **kwargs)
+
+        if "error" in search_response:
+            logger.error(f"Error en búsqueda inicial: {search_response['error']}")
+            yield search_response
+            return
+
+        session_token = search_response["session_token"]
+        state = SearchState()
+        state.merge(search_response["results"])
+        strategy.observe(search_response["results"])
+        yield state
+
+        while state.status == STATUS_INCOMPLETE and not strategy.expired():
+            await asyncio.sleep(strategy.next_wait())
+            if strategy.expired():
+                break
+
+            logger.info(f"Intento de polling #{strategy.polls} ({origin} → {destination})")
+            poll_response = await self.poll_search_results(
+                session_token, timeout=self.sync_client._deadline_timeout(strategy)
+            )
+
+            if "error" in poll_response:
+                logger.error(f"Error en polling: {poll_response['error']}")
+                if not state.itinerary_count():
+                    yield poll_response
+                return
+
+            state.merge(poll_response)
+            strategy.observe(poll_response)
+            yield state
+
+    async def complete_search(self, origin, destination, date, deadline=None, **kwargs):
+        """
+        Complete a flight search, polling until results are complete or the deadline expires.
+
+        A failed search falls back to stale cached results when there are any.
+        Like the sync client, identical concurrent searches (from either
+        client) share one upstream search through its SingleFlight.
+        """
+        key = make_search_key(origin, destination, date, **kwargs)
+        cached = self.sync_client._cache_get(key)
+        if cached is not None:
+            return cached
+
+        try:
+            return await self.sync_client.singleflight.do_async(
+                key, self._run_search, key, origin, destination, date,
+                wait_timeout=config.SEARCH_DEADLINE if deadline is None else deadline, deadline=deadline, **kwargs
+            )
+        except SingleFlightTimeout:
+            return self._shared_search_timeout(key, origin, destination)
+
+    def _shared_search_timeout(self, key, origin, destination):
+        # El deadline de quien se unió a una búsqueda idéntica se agotó antes que ella
+        stale = self.sync_client._cache_get_stale(key)
+        if stale is not None:
+            logger.warning(f"Sirviendo resultados caducados de {origin} → {destination}: "
+                           f"la búsqueda compartida supera el deadline")
+            return stale
+        return {"error": "Search deadline exceeded while waiting for an identical search in progress"}
+
+    async def _run_search(self, key, origin, destination, date, deadline=None, **kwargs):
+        # Otra búsqueda idéntica puede haber llenado la caché mientras tanto
+        cached = self.sync_client._cache_peek(key)
+        if cached is not None:
+            return cached
+
+        state = None
+        async for state in self._aiter_states(origin, destination, date, deadline=deadline, **kwargs):
+            pass
+
+        if isinstance(state, SearchState):
+            SEARCH_POLLS.observe(state.polls)
+        results = state.to_results() if isinstance(state, SearchState) else state
+        if "error" in results:
+            stale = self.sync_client._cache_get_stale(key)
+            if stale is not None:
+                # Upstream degradado: mejor datos antiguos que un error
+                logger.warning(f"Sirviendo resultados caducados de {origin} → {destination}: {results['error']}")
+                return stale
+        self.sync_client._cache_set(key, results)
+        return results
+
+    async def aiter_search(self, origin, destination, date, deadline=None, **kwargs):
+        """
+        Run a live search and yield batches of new or updated itineraries as polls arrive.
+
+        Once the search completes its merged results are stored in the cache.
+        If the search fails before any result arrives, stale cached results
+        (within the cache hard TTL) are yielded as a single batch instead.
+        The search takes part in the sync client's SingleFlight: while an
+        identical search is in flight, its final results are awaited on the
+        event loop (at most `deadline` seconds) and yielded as a single batch
+        instead of starting another one.
+        """
+        key = make_search_key(origin, destination, date, **kwargs)
+        singleflight = self.sync_client.singleflight
+        call, waiter = singleflight.join(key, asyncio.get_running_loop())
+        if waiter is not None:
+            try:
+                await wait_async(waiter, config.SEARCH_DEADLINE if deadline is None else deadline)
+                results = call.outcome()
+            except SingleFlightTimeout:
+                results = self._shared_search_timeout(key, origin, destination)
+            yield results if "error" in results else results_batch(results)
+            return
+
+        try:
+            async for batch in self._aiter_batches(key, origin, destination, date, deadline, call, **kwargs):
+                yield batch
+        except BaseException as e:
+            # Los que esperan esta búsqueda no deben recibir la cancelación de este stream
+            call.error = e if isinstance(e, Exception) else RuntimeError("Shared search was cancelled")
+            raise
+        finally:
+            singleflight.finish(key, call)
+
+    async def _aiter_batches(self, key, origin, destination, date, deadline, call, **kwargs):
+        """Batches of aiter_search for the leader of a search; leaves its final results in call.result"""
+        version, status, state = 0, None, None
+        async for state in self._aiter_states(origin, destination, date, deadline=deadline, **kwargs):
+            if not isinstance(state, SearchState):
+                stale = self.sync_client._cache_get_stale(key)
+                if stale is not None:
+                    logger.warning(f"Sirviendo resultados caducados de {origin} → {destination}: {state['error']}")
+                    call.result = stale
+                    yield results_batch(stale)
+                else:
+                    call.result = state
+                    yield state
+                return
+            if state.version != version or state.status != status:
+                yield state.batch(version)
+                version, status = state.version, state.status
+
+        if state is not None:
+            SEARCH_POLLS.observe(state.polls)
+            call.result = state.to_results()
+            self.sync_client._cache_set(key, call.result)
+
+    async def search_many(self, routes, deadline=None, max_concurrency=None):
+        """
+        Run several complete searches concurrently on the current event loop.
+
+        Each route is a dict with "origin", "destination" and "date" plus any
+        optional search_flights argument. Identical routes run only once, at
+        most `max_concurrency` searches run at a time, and `deadline` (seconds)
+        is shared by the whole batch: searches still queued when it runs out
+        are not started. Results come back in the same order as the routes; an
+        invalid or failing route yields an error dict instead of raising.
+        """
+        loop = asyncio.get_running_loop()
+        batch_end = None if deadline is None else loop.time() + deadline
+        limit = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+
+        async def run(route):
+            params = dict(route)
+            route_deadline = params.pop("deadline", None)
+            if batch_end is not None:
+                remaining = batch_end - loop.time()
+                if remaining <= 0:
+                    return {"error": "Batch deadline exceeded before the search started"}
+                route_deadline = remaining if route_deadline is None else min(route_deadline, remaining)
+            try:
+                return await self.complete_search(
+                    params.pop("origin"), params.pop("destination"), params.pop("date"),
+                    deadline=route_deadline, **params
+                )
+            except Exception as e:
+                logger.exception("Error durante la búsqueda concurrente")
+                return {"error": f"Search exception: {str(e)}"}
+
+        async def run_limited(route):
+            if limit is None:
+                return await run(route)
+            async with limit:
+                return await run(route)
+
+        # Las rutas repetidas comparten una única búsqueda; una ruta inválida
+        # solo produce el error de su propia posición
+        keys, invalid = [], {}
+        for position, route in enumerate(routes):
+            try:
+                keys.append(make_search_key(**{k: v for k, v in route.items() if k != "deadline"}))
+            except (TypeError, ValueError, AttributeError) as e:
+                keys.append(None)
+                invalid[position] = {"error": f"Invalid query: {str(e)}"}
+        unique = {key: route for key, route in zip(keys, routes) if key is not None}
+        results = await asyncio.gather(*(run_limited(route) for route in unique.values()))
+        by_key = dict(zip(unique, results))
+        return [invalid[position] if key is None else by_key[key] for position, key in enumerate(keys)]
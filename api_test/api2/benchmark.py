@@ -0,0 +1,246 @@
+"""
+Benchmarks for the flight search client and result processing.
+
+Everything runs in-process against a fake transport (a requests adapter that
+serves pre-serialized mock_data payloads), so results do not depend on the
+network. Each result is printed as one JSON line; --output writes them to a
+file and --compare flags regressions against a previous run:
+
+    python benchmark.py --output baseline.jsonl
+    python benchmark.py --compare baseline.jsonl --threshold 0.25
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from requests.adapters import BaseAdapter
+from requests.models import Response
+import config
+import mock_data
+from itinerary_index import ItineraryIndex
+from lazy_response import LazySearchResponse
+from resilience import TokenBucket, CircuitBreaker
+from search_state import SearchState
+from skyscanner_api import SkyscannerApiClient, create_http_session
+
+SIZES = (100, 1000, 10000)
+
+
+class FakeTransport(BaseAdapter):
+    """requests adapter answering Skyscanner endpoints from memory, with optional latency"""
+
+    def __init__(self, itineraries=100, polls_to_complete=2, latency=0.0):
+        super().__init__()
+        self.latency = latency
+        self.polls_to_complete = polls_to_complete
+        self._polls = {}
+        self._lock = threading.Lock()
+        self._counter = 0
+        self._stages = [
+            json.dumps(mock_data.generate_flight_results(
+                itineraries=itineraries if stage >= polls_to_complete else max(1, itineraries // 2),
+                status="RESULT_STATUS_COMPLETE" if stage >= polls_to_complete else "RESULT_STATUS_INCOMPLETE",
+            )).encode()
+            for stage in range(polls_to_complete + 1)
+        ]
+        self._indicative = json.dumps(mock_data.generate_indicative_results("MAD", "BCN", "2024-01-01", "2024-01-31")).encode()
+
+    def send(self, request, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        response = Response()
+        response.status_code = 200
+        response.url = request.url
+        response.request = request
+        response.headers["Content-Type"] = "application/json"
+
+        if request.url.endswith("/search/create"):
+            with self._lock:
+                self._counter += 1
+                token = f"bench-{self._counter}"
+                self._polls[token] = 0
+            response.headers["x-session-token"] = token
+            response._content = self._stages[0]
+        elif "/search/poll/" in request.url:
+            token = request.url.rsplit("/", 1)[1]
+            with self._lock:
+                self._polls[token] += 1
+                stage = min(self._polls[token], self.polls_to_complete)
+            response._content = self._stages[stage]
+        else:
+            response._content = self._indicative
+        return response
+
+    def close(self):
+        pass
+
+
+def make_client(transport):
+    session = create_http_session()
+    session.mount("https://", transport)
+    # Sin límites del lado cliente: se mide el cliente, no el rate limiter
+    return SkyscannerApiClient(
+        session=session,
+        rate_limiter=TokenBucket(rate=1e9, burst=1e9),
+        circuit_breaker=CircuitBreaker(),
+    )
+
+
+def measure(name, func, size=None, repeat=5, number=1, operations=1):
+    """Time func and return a result record (milliseconds per call)"""
+    func()  # calentamiento
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - started) * 1000 / number)
+    samples.sort()
+    median = statistics.median(samples)
+    return {
+        "benchmark": name,
+        "size": size,
+        "repeat": repeat,
+        "min_ms": round(samples[0], 3),
+        "median_ms": round(median, 3),
+        "max_ms": round(samples[-1], 3),
+        "ops_per_sec": round(operations * 1000 / median, 2) if median else None,
+    }
+
+
+def bench_processing(sizes):
+    for size in sizes:
+        results = mock_data.generate_flight_results(itineraries=size)
+        raw = json.dumps(results).encode()
+        client = make_client(FakeTransport())
+        repeat = 5 if size <= 1000 else 3
+
+        yield measure("decode.json_loads", lambda: json.loads(raw), size, repeat)
+        yield measure("decode.lazy_cheapest",
+                      lambda: min(i.cheapest.amount for i in LazySearchResponse(raw).itineraries.values()),
+                      size, repeat)
+        yield measure("format.itinerary_results", lambda: client.format_itinerary_results(results), size, repeat)
+        yield measure("index.build", lambda: ItineraryIndex.from_results(results), size, repeat)
+        index = ItineraryIndex.from_results(results)
+        index.top_k(5)
+        yield measure("index.top_k_nonstop", lambda: index.top_k(5, nonstop=True), size, repeat, number=100)
+
+        def merge_twice():
+            state = SearchState()
+            state.merge(results)
+            state.merge(results)
+        yield measure("state.merge_unchanged", merge_twice, size, repeat)
+
+
+@contextmanager
+def no_poll_waits():
+    """Set the polling waits to zero, restoring the configured ones afterwards"""
+    saved = config.POLL_FIRST_WAIT, config.POLL_MIN_INTERVAL, config.POLL_MAX_INTERVAL
+    config.POLL_FIRST_WAIT = config.POLL_MIN_INTERVAL = config.POLL_MAX_INTERVAL = 0
+    try:
+        yield
+    finally:
+        config.POLL_FIRST_WAIT, config.POLL_MIN_INTERVAL, config.POLL_MAX_INTERVAL = saved
+
+
+def bench_search(polls):
+    # Esperas de polling a cero: se mide el coste de create+poll, no los sleeps
+    with no_poll_waits():
+        for size in (100, 1000):
+            client = make_client(FakeTransport(itineraries=size, polls_to_complete=polls))
+            yield measure("search.create_poll", lambda: client.complete_search("MAD", "BCN", "2024-01-15"),
+                          size, repeat=5)
+
+
+def bench_concurrency(routes, latency):
+    routes_list = [{"origin": "MAD", "destination": f"D{i:02d}", "date": "2024-01-15"} for i in range(routes)]
+    client = make_client(FakeTransport(itineraries=100, polls_to_complete=1, latency=latency))
+
+    def sequential():
+        for route in routes_list:
+            client.complete_search(**route)
+
+    def threaded():
+        with ThreadPoolExecutor(max_workers=config.ASYNC_MAX_IN_FLIGHT) as pool:
+            list(pool.map(lambda route: client.complete_search(**route), routes_list))
+
+    def fan_out():
+        client.search_many(routes_list)
+
+    # Solo cuenta la latencia simulada de cada petición, no las esperas entre polls
+    with no_poll_waits():
+        yield measure("concurrency.sequential", sequential, routes, repeat=3, operations=routes)
+        yield measure("concurrency.threads", threaded, routes, repeat=3, operations=routes)
+        yield measure("concurrency.search_many", fan_out, routes, repeat=3, operations=routes)
+
+
+def compare(results, baseline_path, threshold):
+    """Return the benchmarks whose median got slower than the baseline by more than threshold"""
+    baseline = {}
+    with open(baseline_path) as f:
+        for line in f:
+            record = json.loads(line)
+            if "benchmark" in record:
+                baseline[(record["benchmark"], record["size"])] = record
+    regressions = []
+    for record in results:
+        previous = baseline.get((record["benchmark"], record["size"]))
+        if previous and previous["median_ms"] and record["median_ms"] > previous["median_ms"] * (1 + threshold):
+            regressions.append({
+                "benchmark": record["benchmark"],
+                "size": record["size"],
+                "baseline_ms": previous["median_ms"],
+                "median_ms": record["median_ms"],
+                "change": round(record["median_ms"] / previous["median_ms"] - 1, 3),
+            })
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmarks del cliente de búsqueda de vuelos')
+    parser.add_argument('--sizes', type=str, default=','.join(map(str, SIZES)),
+                        help='Tamaños de respuesta (itinerarios) separados por comas')
+    parser.add_argument('--polls', type=int, default=2, help='Polls por búsqueda en el benchmark de búsqueda')
+    parser.add_argument('--routes', type=int, default=16, help='Rutas del benchmark de concurrencia')
+    parser.add_argument('--latency-ms', type=float, default=50, help='Latencia simulada por petición (concurrencia)')
+    parser.add_argument('--only', choices=['processing', 'search', 'concurrency'], help='Ejecutar un solo grupo')
+    parser.add_argument('--output', '-o', help='Fichero JSON lines donde guardar los resultados')
+    parser.add_argument('--compare', '-c', help='Resultados anteriores (JSON lines) con los que comparar')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Empeoramiento relativo tolerado (default: 0.25)')
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.WARNING)
+
+    groups = {
+        "processing": lambda: bench_processing([int(size) for size in args.sizes.split(',')]),
+        "search": lambda: bench_search(args.polls),
+        "concurrency": lambda: bench_concurrency(args.routes, args.latency_ms / 1000),
+    }
+    meta = {"meta": {"python": platform.python_version(), "platform": platform.platform(),
+                     "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")}}
+    results = []
+    lines = [json.dumps(meta)]
+    print(lines[0])
+    for name, group in groups.items():
+        if args.only and name != args.only:
+            continue
+        for record in group():
+            results.append(record)
+            lines.append(json.dumps(record))
+            print(lines[-1], flush=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        for regression in regressions:
+            print(json.dumps({"regression": regression}))
+        sys.exit(1 if regressions else 0)
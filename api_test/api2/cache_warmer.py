@@ -0,0 +1,190 @@
+import logging
+import threading
+import time
+from collections import Counter, deque
+import config
+from search_cache import make_search_key
+from polling import STATUS_COMPLETE
+
+logger = logging.getLogger(__name__)
+
+QUERY_FIELDS = ("origin", "destination", "date", "adults", "children_ages")
+
+
+class RecentSearches:
+    """
+    Sliding window of recent interactive searches, used to pick routes to warm
+    """
+
+    def __init__(self, window=None, clock=time.monotonic):
+        self.window = window or config.RECENT_SEARCHES_WINDOW
+        self.clock = clock
+        self._events = deque()  # (timestamp, search key, query)
+        self._lock = threading.Lock()
+        self.last_activity = None
+
+    def record(self, **query):
+        """Record an interactive search; queries without a valid search key are ignored"""
+        now = self.clock()
+        query = {field: query.get(field) for field in QUERY_FIELDS if query.get(field) is not None}
+        try:
+            key = make_search_key(**query)
+        except (TypeError, ValueError, AttributeError):
+            logger.debug(f"Búsqueda no válida ignorada para el precalentamiento: {query}")
+            return
+        with self._lock:
+            self._events.append((now, key, query))
+            self.last_activity = now
+            self._trim(now)
+
+    def _trim(self, now):
+        while self._events and now - self._events[0][0] > self.window:
+            self._events.popleft()
+
+    def idle_for(self):
+        """Seconds since the last interactive search (infinite if none)"""
+        if self.last_activity is None:
+            return float("inf")
+        return self.clock() - self.last_activity
+
+    def top_routes(self, limit=20):
+        """Return the most frequent recent queries, most popular first"""
+        with self._lock:
+            self._trim(self.clock())
+            counts = Counter()
+            queries = {}
+            for _, key, query in self._events:
+                counts[key] += 1
+                queries[key] = query
+        return [queries[key] for key, _ in counts.most_common(limit)]
+
+
+class CacheWarmer:
+    """
+    Background thread that pre-searches popular routes into the search cache.
+
+    Each cycle collects candidate queries from the route sources (callables
+    returning query dicts), skips the ones whose cached result is still
+    fresh enough, and runs the rest through the client, so the results land
+    in its cache. Warming only happens during quiet periods: it gives way
+    while `is_busy()` is true, and stops a cycle whenever using one more
+    rate-limit token would eat into the reserve kept for interactive traffic.
+    """
+
+    def __init__(self, client, route_sources, is_busy=None, interval=None, max_per_cycle=None,
+                 token_reserve=None, refresh_at=None):
+        self.client = client
+        self.route_sources = list(route_sources)
+        self.is_busy = is_busy or (lambda: False)
+        self.interval = interval or config.CACHE_WARMER_INTERVAL
+        self.max_per_cycle = max_per_cycle or config.CACHE_WARMER_MAX_PER_CYCLE
+        self.token_reserve = config.CACHE_WARMER_TOKEN_RESERVE if token_reserve is None else token_reserve
+        self.refresh_at = refresh_at or config.CACHE_WARMER_REFRESH_AT
+        self._stop = threading.Event()
+        self._thread = None
+        self.cycles = 0
+        self.warmed = 0
+        self.failed = 0
+        self.skipped_fresh = 0
+        self.deferred_busy = 0
+        self.deferred_rate_limit = 0
+
+    def candidates(self):
+        """Collect deduplicated candidate queries from every route source"""
+        seen = set()
+        queries = []
+        for source in self.route_sources:
+            try:
+                routes = source()
+            except Exception:
+                logger.exception("Error obteniendo rutas para precalentar la caché")
+                continue
+            for query in routes:
+                try:
+                    key = make_search_key(**query)
+                except (TypeError, ValueError, AttributeError):
+                    logger.warning(f"Ruta no válida ignorada para el precalentamiento: {query}")
+                    continue
+                if key not in seen:
+                    seen.add(key)
+                    queries.append((key, query))
+        return queries
+
+    def _needs_refresh(self, key):
+        age = self.client.cache.age(key)
+        return age is None or age > self.client.cache.ttl * self.refresh_at
+
+    def run_once(self):
+        """Run one warming cycle and return the number of routes warmed"""
+        self.cycles += 1
+        warmed = 0
+        for key, query in self.candidates():
+            if warmed >= self.max_per_cycle:
+                break
+            if not self._needs_refresh(key):
+                self.skipped_fresh += 1
+                continue
+            if self.is_busy():
+                self.deferred_busy += 1
+                break
+            # Una búsqueda cuesta varias peticiones: se deja margen para el tráfico interactivo
+            if self.client.rate_limiter.available() < self.token_reserve + 1:
+                self.deferred_rate_limit += 1
+                break
+
+            result, searched = self._refresh(key, query)
+            if result and result.get("status") == STATUS_COMPLETE:
+                # Solo se marca lo que ha buscado el propio warmer
+                if searched:
+                    self.client.cache.mark_warmed(key)
+                self.warmed += 1
+                warmed += 1
+            else:
+                self.failed += 1
+        if warmed:
+            logger.info(f"Caché precalentada con {warmed} rutas")
+        return warmed
+
+    def _refresh(self, key, query):
+        """
+        Run a new upstream search for a query, bypassing the cached entry it refreshes.
+
+        Returns (results, searched): searched is False when the warmer joined
+        an identical search already in flight instead of running its own.
+        """
+        searched = []
+
+        def search():
+            searched.append(True)
+            return self.client._run_search(key, refresh=True, **query)
+
+        return self.client.singleflight.do(key, search), bool(searched)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Error en el ciclo de precalentamiento de la caché")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="cache-warmer", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        cache_stats = self.client.cache.stats()
+        return {
+            "cycles": self.cycles,
+            "warmed": self.warmed,
+            "failed": self.failed,
+            "skipped_fresh": self.skipped_fresh,
+            "deferred_busy": self.deferred_busy,
+            "deferred_rate_limit": self.deferred_rate_limit,
+            "warm_hits": cache_stats["warm_hits"],
+            "warm_hit_ratio": cache_stats["warm_hit_ratio"],
+        }
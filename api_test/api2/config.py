@@ -1,10 +1,18 @@
+import os
+
 API_KEY = "sh967490139224896692439644109194"
-API_BASE_URL = "https://partners.api.skyscanner.net/apiservices"
+# Override to point the client at a local stand-in (see mock_server.py)
+API_BASE_URL = os.environ.get("SKYSCANNER_API_BASE_URL", "https://partners.api.skyscanner.net/apiservices")
 API_VERSION = "v3"
 
 # App configuration
 QUESTIONS_PER_USER = 25
 ROOM_CODE_LENGTH = 6
+# Key of the permutation that turns room counters into codes (see room_codes.py);
+# changing it on a live database can reissue existing codes
+ROOM_CODE_SECRET = os.environ.get("ROOM_CODE_SECRET", "change-me-room-code-secret")
+ROOM_CODE_BLOCK_SIZE = 100    # Counter values reserved per database round trip
+ROOM_CODE_MAX_ATTEMPTS = 5    # Room inserts retried on a unique-constraint collision
 
 # Database configuration
 DATABASE_URL = "sqlite:///travel_app.db"  # Change as needed for production
@@ -12,4 +20,98 @@ DATABASE_URL = "sqlite:///travel_app.db"  # Change as needed for production
 # Currency, market and locale defaults
 DEFAULT_CURRENCY = "EUR"
 DEFAULT_MARKET = "ES"
-DEFAULT_LOCALE = "es-ES"
\ No newline at end of file
+DEFAULT_LOCALE = "es-ES"
+
+# HTTP transport configuration for the Skyscanner client
+HTTP_POOL_CONNECTIONS = 4      # Number of per-host pools kept by the session
+HTTP_POOL_MAXSIZE = 20         # Keep-alive connections per host (>= Flask worker threads)
+HTTP_CONNECT_TIMEOUT = 3.05    # Seconds to establish the TCP+TLS connection
+HTTP_READ_TIMEOUT = 15         # Seconds to wait for the upstream response
+HTTP_MAX_RETRIES = 2           # Transport-level retries for connection errors and 503
+HTTP_RETRY_BACKOFF = 0.3       # Backoff factor between transport retries
+
+# Maximum number of upstream requests in flight for the asyncio client
+ASYNC_MAX_IN_FLIGHT = 8
+
+# Adaptive polling of live searches
+POLL_FIRST_WAIT = 0.3          # Seconds before the first poll
+POLL_MIN_INTERVAL = 0.3        # Interval used while results keep changing
+POLL_MAX_INTERVAL = 3.0        # Upper bound for the backoff between polls
+POLL_BACKOFF_FACTOR = 1.6      # Growth of the interval while results do not change
+SEARCH_DEADLINE = 12.0         # Default overall deadline (seconds) for complete_search
+SEARCH_MAX_DEADLINE = 30.0     # Upper bound for deadlines requested by clients
+
+# In-process cache of complete flight search results
+SEARCH_CACHE_TTL = 300                   # Seconds a cached search stays fresh
+SEARCH_CACHE_MAX_ENTRIES = 500           # Maximum number of cached searches
+SEARCH_CACHE_MAX_BYTES = 64 * 1024 * 1024  # Approximate memory budget (serialized size)
+
+# Indicative prices (price matrix / calendars)
+INDICATIVE_CACHE_TTL = 3600    # Seconds an indicative price cell stays fresh
+INDICATIVE_CACHE_MAX_ENTRIES = 50000  # One entry per (route, day) cell
+INDICATIVE_MAX_DAYS = 92       # Longest date window accepted for a price matrix
+INDICATIVE_MAX_ROUTES = 100    # Maximum origin × destination pairs per matrix
+
+# Client-side protection of the shared API key
+RATE_LIMIT_PER_SECOND = 5.0    # Sustained upstream requests per second (create + poll + indicative)
+RATE_LIMIT_BURST = 10          # Token bucket capacity
+RATE_LIMIT_MAX_WAIT = 2.0      # Seconds a request may wait for a token before failing
+BREAKER_FAILURE_THRESHOLD = 5  # Consecutive 429/5xx/transport failures that open the circuit
+BREAKER_RECOVERY_TIMEOUT = 30  # Seconds the circuit stays open before probing again
+BREAKER_HALF_OPEN_PROBES = 1   # Concurrent probe requests allowed while half-open
+
+# Flexible-date ("cheapest day") searches
+CALENDAR_LIVE_CONFIRM = 3           # Days confirmed with a live search after indicative pricing
+RECOMMENDATION_DAYS_AHEAD = 30      # Recommended trips are priced around this many days from now
+RECOMMENDATION_FLEX_DAYS = 3        # ± days searched around that date (0 = fixed date)
+
+# Background cache warmer for popular routes
+CACHE_WARMER_ENABLED = True
+CACHE_WARMER_INTERVAL = 120          # Seconds between warming cycles
+CACHE_WARMER_MAX_PER_CYCLE = 10      # Upstream searches per cycle at most
+CACHE_WARMER_IDLE_SECONDS = 5        # Interactive silence required before warming
+CACHE_WARMER_TOKEN_RESERVE = 5       # Rate-limit tokens always left for interactive traffic
+CACHE_WARMER_REFRESH_AT = 0.75       # Re-warm entries older than this fraction of the TTL
+RECENT_SEARCHES_WINDOW = 3600        # Seconds of /api/search traffic considered "recent"
+
+# Serving mode of /api/search: "fresh" always waits for a fresh (or fresh cached) result,
+# "stale-while-revalidate" returns results past SEARCH_CACHE_TTL at once and refreshes them
+SEARCH_SERVING_MODE = "stale-while-revalidate"
+SEARCH_CACHE_HARD_TTL = 1800   # Seconds after which a cached search is never served by SWR
+REVALIDATE_WORKERS = 2         # Background threads refreshing stale searches
+
+# Asynchronous search jobs (POST /api/search with "async": true)
+SEARCH_JOB_WORKERS = 8          # Threads running search jobs
+SEARCH_JOB_MAX_PENDING = 200    # Unfinished jobs accepted before answering 503
+SEARCH_JOB_TTL = 600            # Seconds a finished job stays available
+
+# Server-Sent Events streaming of live searches (one asyncio loop for all streams)
+SSE_ENABLED = True
+SSE_HOST = "0.0.0.0"
+SSE_PORT = 5002
+SSE_MAX_STREAMS = 1000      # Open streams accepted before answering 503
+SSE_KEEPALIVE = 15          # Seconds between keep-alive comments on idle streams
+
+# Batch search endpoint (POST /api/search/batch)
+BATCH_SEARCH_MAX_QUERIES = 20   # Queries accepted per batch
+BATCH_SEARCH_CONCURRENCY = 4    # Searches of one batch running at the same time
+BATCH_SEARCH_DEADLINE = 15      # Default seconds shared by the whole batch
+
+# Admission control of upstream-heavy routes (search, batch, calendar, price matrix)
+ADMISSION_MAX_CONCURRENT = 16   # Requests running at the same time
+ADMISSION_MAX_QUEUE = 32        # Requests waiting for a slot before answering 429
+ADMISSION_QUEUE_TIMEOUT = 2.0   # Seconds a request may wait for a slot
+
+# Storage of participant answers: "rows" keeps one Response row per answer, "bitmask"
+# one ResponseVector per participant (answers packed into integers, see answer_vectors.py).
+# Existing Response rows are not converted: switch only on a database without answers
+RESPONSE_STORAGE = "rows"
+
+# QR codes of room invitations (qr_service.py)
+JOIN_BASE_URL = "http://yourapp.com/join/"
+QR_DEFAULT_BOX_SIZE = 10        # Pixels (PNG) per QR module
+QR_MAX_BOX_SIZE = 40
+QR_CACHE_MAX_ENTRIES = 2000     # Rendered images kept in memory
+QR_RENDER_WORKERS = 2           # Threads rendering QR images
+QR_RENDER_TIMEOUT = 5.0         # Seconds a request waits for its image to be rendered
+QR_HTTP_MAX_AGE = 2592000       # Cache-Control max-age of served images (30 days)
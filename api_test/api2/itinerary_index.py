@@ -0,0 +1,184 @@
+import heapq
+import math
+
+SORT_CHEAPEST = "cheapest"
+SORT_FASTEST = "fastest"
+SORT_EARLIEST = "earliest"
+
+
+def _departure_key(date_time):
+    """Encode a Skyscanner date-time dict as a sortable integer (YYYYMMDDHHMM)"""
+    if not date_time:
+        return math.inf
+    return (((date_time.get("year", 0) * 100 + date_time.get("month", 0)) * 100
+             + date_time.get("day", 0)) * 100 + date_time.get("hour", 0)) * 100 + date_time.get("minute", 0)
+
+
+class ItineraryIndex:
+    """
+    Column-oriented index over the itineraries of a search/poll response.
+
+    The nested response is walked once; each itinerary becomes a row in
+    parallel lists (price, agents, legs, and lazily duration, stops and
+    departure). The first top-k query of a sort key selects its rows with a
+    heap (O(n log k)); from the second one on, the full order is computed
+    once and reused, so repeated queries only scan rows until k of them pass
+    the filters.
+    """
+
+    def __init__(self):
+        self.ids = []
+        self.prices = []
+        self.units = []
+        self.agent_ids = []
+        self.leg_ids = []
+        self.cheapest_options = []
+        self.legs = {}
+        self._durations = None
+        self._stops = None
+        self._departures = None
+        self._orders = {}
+        self._queries = {}  # top-k queries answered per sort key
+
+    @classmethod
+    def from_results(cls, results):
+        index = cls()
+        content = results.get("content", {}).get("results", {}) if results else {}
+        index.legs = content.get("legs", {})
+        inf = math.inf
+
+        # Columnas locales para evitar búsquedas de atributos en el bucle
+        ids, prices, units = index.ids, index.prices, index.units
+        options, agent_ids, leg_id_column = index.cheapest_options, index.agent_ids, index.leg_ids
+
+        for itin_id, itin in content.get("itineraries", {}).items():
+            pricing = itin.get("pricingOptions")
+            if not pricing:
+                continue
+            cheapest, best = None, None
+            for option in pricing:
+                amount = option.get("price", {}).get("amount")
+                amount = inf if amount is None else float(amount)
+                if best is None or amount < best:
+                    cheapest, best = option, amount
+
+            ids.append(itin_id)
+            prices.append(best)
+            units.append(cheapest.get("price", {}).get("unit", "EUR"))
+            options.append(cheapest)
+            agent_ids.append(cheapest.get("agentIds", ()))
+            leg_id_column.append(itin.get("legIds", ()))
+        return index
+
+    def _build_leg_columns(self):
+        # Las columnas derivadas de los legs solo se calculan si una consulta las usa
+        legs = self.legs
+        inf = math.inf
+        durations, stops, departures = [], [], []
+        for leg_ids in self.leg_ids:
+            duration = stop_count = 0
+            departure = inf
+            for leg_id in leg_ids:
+                leg = legs.get(leg_id)
+                if leg is None:
+                    continue
+                duration += leg.get("durationInMinutes") or 0
+                stop_count += leg.get("stopCount", 0)
+                if departure == inf:
+                    departure = _departure_key(leg.get("departureDateTime"))
+            durations.append(duration or inf)
+            stops.append(stop_count)
+            departures.append(departure)
+        self._durations, self._stops, self._departures = durations, stops, departures
+
+    @property
+    def durations(self):
+        """Total flying time in minutes of every itinerary"""
+        if self._durations is None:
+            self._build_leg_columns()
+        return self._durations
+
+    @property
+    def stops(self):
+        """Total number of stops of every itinerary"""
+        if self._stops is None:
+            self._build_leg_columns()
+        return self._stops
+
+    @property
+    def departures(self):
+        """Departure of the first leg of every itinerary as YYYYMMDDHHMM"""
+        if self._departures is None:
+            self._build_leg_columns()
+        return self._departures
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _column(self, sort):
+        if sort == SORT_CHEAPEST:
+            return self.prices
+        if sort == SORT_FASTEST:
+            return self.durations
+        if sort == SORT_EARLIEST:
+            return self.departures
+        raise ValueError(f"Unknown sort: {sort}")
+
+    def _order(self, sort):
+        order = self._orders.get(sort)
+        if order is None:
+            column = self._column(sort)
+            # sorted() es estable: los empates conservan el orden de la respuesta
+            order = self._orders[sort] = sorted(range(len(column)), key=column.__getitem__)
+        return order
+
+    def top_k(self, k=5, sort=SORT_CHEAPEST, nonstop=False, max_stops=None, max_price=None,
+              max_duration=None, agent_id=None):
+        """
+        Return the row numbers of the k best itineraries for a sort key and filters
+        """
+        if nonstop:
+            max_stops = 0
+
+        stops = self.stops if max_stops is not None else None
+        durations = self.durations if max_duration is not None else None
+
+        def accepted(row):
+            return ((stops is None or stops[row] <= max_stops)
+                    and (max_price is None or self.prices[row] <= max_price)
+                    and (durations is None or durations[row] <= max_duration)
+                    and (agent_id is None or agent_id in self.agent_ids[row]))
+
+        if sort not in self._orders and not self._queries.get(sort):
+            # Una sola consulta no amortiza ordenar todas las filas
+            self._queries[sort] = 1
+            column = self._column(sort)
+            # nsmallest equivale a sorted()[:k]: los empates conservan el orden de la respuesta
+            return heapq.nsmallest(k, filter(accepted, range(len(column))), key=column.__getitem__)
+        self._queries[sort] = self._queries.get(sort, 0) + 1
+
+        rows = []
+        for row in self._order(sort):
+            if accepted(row):
+                rows.append(row)
+                if len(rows) == k:
+                    break
+        return rows
+
+    def row(self, row):
+        """Return one itinerary row as a dict"""
+        return {
+            "id": self.ids[row],
+            "price": self.prices[row],
+            "unit": self.units[row],
+            "duration": self.durations[row],
+            "stops": self.stops[row],
+            "agent_ids": list(self.agent_ids[row]),
+            "leg_ids": list(self.leg_ids[row]),
+        }
+
+    def cheapest(self, k=5, **filters):
+        return [self.row(row) for row in self.top_k(k, SORT_CHEAPEST, **filters)]
+
+    def fastest(self, k=5, **filters):
+        return [self.row(row) for row in self.top_k(k, SORT_FASTEST, **filters)]
@@ -0,0 +1,205 @@
+import json
+import re
+
+_decoder = json.JSONDecoder()
+_STATUS_RE = re.compile(r'"status"\s*:\s*"([A-Z_]+)"')
+_ACTION_RE = re.compile(r'"action"\s*:\s*"([A-Z_]+)"')
+_TOKEN_RE = re.compile(r'"sessionToken"\s*:\s*"([^"]*)"')
+
+
+def _date_tuple(date_time):
+    if not date_time:
+        return None
+    return (date_time.get("year"), date_time.get("month"), date_time.get("day"),
+            date_time.get("hour", 0), date_time.get("minute", 0))
+
+
+class PricingOption:
+    __slots__ = ("id", "amount", "unit", "agent_ids", "deep_link")
+
+    def __init__(self, option_id, amount, unit, agent_ids, deep_link):
+        self.id = option_id
+        self.amount = amount
+        self.unit = unit
+        self.agent_ids = agent_ids
+        self.deep_link = deep_link
+
+    @classmethod
+    def from_dict(cls, option):
+        price = option.get("price", {})
+        amount = price.get("amount")
+        items = option.get("items") or ()
+        return cls(
+            option.get("id"),
+            None if amount is None else float(amount),
+            price.get("unit"),
+            tuple(option.get("agentIds", ())),
+            items[0].get("deepLink") if items else None,
+        )
+
+
+class Itinerary:
+    __slots__ = ("id", "pricing_options", "leg_ids")
+
+    def __init__(self, itinerary_id, pricing_options, leg_ids):
+        self.id = itinerary_id
+        self.pricing_options = pricing_options
+        self.leg_ids = leg_ids
+
+    @property
+    def cheapest(self):
+        priced = [option for option in self.pricing_options if option.amount is not None]
+        return min(priced, key=lambda option: option.amount) if priced else None
+
+
+class Leg:
+    __slots__ = ("id", "origin", "destination", "departure", "arrival", "duration",
+                 "stop_count", "segment_ids")
+
+    def __init__(self, leg_id, origin, destination, departure, arrival, duration, stop_count, segment_ids):
+        self.id = leg_id
+        self.origin = origin
+        self.destination = destination
+        self.departure = departure
+        self.arrival = arrival
+        self.duration = duration
+        self.stop_count = stop_count
+        self.segment_ids = segment_ids
+
+
+class _LazyResults:
+    """Read-only view of content.results decoding each section on first get()"""
+
+    def __init__(self, response):
+        self._response = response
+
+    def get(self, name, default=None):
+        return self._response.section(name) or default
+
+    def __getitem__(self, name):
+        return self._response.section(name)
+
+    def __bool__(self):
+        return True
+
+
+class LazySearchResponse:
+    """
+    Search/poll response that keeps the raw JSON text and decodes on demand.
+
+    Top-level fields (status, action, sessionToken) are read with a regex
+    once and remembered. Each section of content.results is located in the
+    raw text and decoded on its own the first time it is accessed, so
+    sections that are never read are never built: SearchState.merge decodes
+    only itineraries and legs, and the reference sections of a poll that a
+    later replaced response supersedes are never decoded. get() and `in`
+    follow the plain response dict for the keys the poll loop uses, so
+    SearchState.merge and PollingStrategy.observe accept it as is.
+    Itineraries and legs are also exposed as compact slotted records instead
+    of nested dicts.
+    """
+
+    def __init__(self, raw):
+        self.text = raw.decode("utf-8") if isinstance(raw, (bytes, bytearray)) else raw
+        self._sections = {}
+        self._fields = {}
+        self._itineraries = None
+        self._legs = None
+
+    def _search(self, pattern):
+        # Cada regex recorre todo el cuerpo: el resultado se guarda
+        if pattern not in self._fields:
+            match = pattern.search(self.text)
+            self._fields[pattern] = match.group(1) if match else None
+        return self._fields[pattern]
+
+    @property
+    def status(self):
+        return self._search(_STATUS_RE)
+
+    @property
+    def action(self):
+        return self._search(_ACTION_RE)
+
+    @property
+    def session_token(self):
+        return self._search(_TOKEN_RE)
+
+    def get(self, key, default=None):
+        """Top-level field of the response, like dict.get on the decoded body"""
+        if key == "status":
+            value = self.status
+        elif key == "action":
+            value = self.action
+        elif key == "sessionToken":
+            value = self.session_token
+        elif key == "content":
+            value = {"results": _LazyResults(self), "stats": self.stats}
+        else:
+            value = None
+        return default if value is None else value
+
+    def __contains__(self, key):
+        # Un poll correcto nunca lleva "error": esos se devuelven como dict
+        return self.get(key) is not None
+
+    @property
+    def stats(self):
+        """content.stats of the response (decoded on first access)"""
+        if "stats" not in self._sections:
+            self._sections["stats"] = self._decode_section("stats", entities=False)
+        return self._sections["stats"]
+
+    def section(self, name):
+        """Decode and return one raw section of content.results (e.g. "segments")"""
+        if name not in self._sections:
+            self._sections[name] = self._decode_section(name)
+        return self._sections[name]
+
+    def _decode_section(self, name, entities=True):
+        # La clave puede repetirse dentro de entidades anidadas (p. ej. "carriers"
+        # en un leg): se prueba desde la última aparición y se acepta el primer
+        # objeto cuyos valores sean entidades (dicts)
+        pattern = re.compile(r'"%s"\s*:\s*\{' % re.escape(name))
+        for match in reversed(list(pattern.finditer(self.text))):
+            value, _ = _decoder.raw_decode(self.text, match.end() - 1)
+            if not entities or all(isinstance(entity, dict) for entity in value.values()):
+                return value
+        return {}
+
+    @property
+    def itineraries(self):
+        """Itinerary records by id (decoded on first access)"""
+        if self._itineraries is None:
+            self._itineraries = {
+                itin_id: Itinerary(
+                    itin_id,
+                    [PricingOption.from_dict(option) for option in itin.get("pricingOptions", ())],
+                    tuple(itin.get("legIds", ())),
+                )
+                for itin_id, itin in self._decode_section("itineraries").items()
+            }
+        return self._itineraries
+
+    @property
+    def legs(self):
+        """Leg records by id (decoded on first access)"""
+        if self._legs is None:
+            self._legs = {
+                leg_id: Leg(
+                    leg_id,
+                    leg.get("originPlaceId"),
+                    leg.get("destinationPlaceId"),
+                    _date_tuple(leg.get("departureDateTime")),
+                    _date_tuple(leg.get("arrivalDateTime")),
+                    leg.get("durationInMinutes"),
+                    leg.get("stopCount", 0),
+                    tuple(leg.get("segmentIds", ())),
+                )
+                for leg_id, leg in self._decode_section("legs").items()
+            }
+        return self._legs
+
+    def to_results(self):
+        """Fully decode the response into the usual nested dicts"""
+        return json.loads(self.text)
@@ -0,0 +1,252 @@
+import bisect
+import math
+import threading
+
+# Buckets (seconds) for request latencies: from cached responses to full live searches
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0)
+POLL_BUCKETS = (0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class _Metric:
+    """
+    Base class of a metric family: one child per combination of label values
+    """
+
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def labels(self, *values):
+        """Return the child for these label values, creating it on first use"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def samples(self):
+        """Yield (suffix, label values, extra label, value) for every child"""
+        with self._lock:
+            children = sorted(self._children.items(), key=lambda item: tuple(map(str, item[0])))
+        for values, child in children:
+            for suffix, extra, value in child.samples():
+                yield suffix, values, extra, value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for suffix, values, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, values, extra)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def samples(self):
+        yield "", None, self.value
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    type_name = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+
+class _GaugeChild:
+    __slots__ = ("value", "function", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self.function = None
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+    def set_function(self, function):
+        """Read the value from a callable at scrape time instead"""
+        self.function = function
+
+    def samples(self):
+        yield "", None, self.function() if self.function is not None else self.value
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, or be computed at scrape time"""
+
+    type_name = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def dec(self, amount=1):
+        self._default.dec(amount)
+
+    def set(self, value):
+        self._default.set(value)
+
+    def set_function(self, function):
+        self._default.set_function(function)
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "_lock")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def samples(self):
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            yield "_bucket", ("le", _format_value(bound)), cumulative
+        yield "_sum", None, total
+        yield "_count", None, cumulative
+
+
+class Histogram(_Metric):
+    """Distribution of observed values over fixed buckets (upper bounds inclusive)"""
+
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+
+class Registry:
+    """
+    Collection of metrics rendered in the Prometheus text exposition format
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Metric {metric.name} already registered with another type or labels")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+# Registro de proceso y métricas compartidas por la app y el cliente de Skyscanner
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "http_requests_total", "HTTP requests handled, by method, route and status", ("method", "route", "status"))
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    "http_request_duration_seconds", "HTTP request latency by method and route", ("method", "route"))
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    "http_requests_in_flight", "HTTP requests currently being handled")
+
+UPSTREAM_REQUESTS = REGISTRY.counter(
+    "upstream_requests_total", "Skyscanner API requests by endpoint and status code (or error/rejected)",
+    ("endpoint", "status"))
+UPSTREAM_DURATION = REGISTRY.histogram(
+    "upstream_request_duration_seconds", "Skyscanner API request latency by endpoint", ("endpoint",))
+SEARCH_POLLS = REGISTRY.histogram(
+    "search_polls", "Create + poll responses received per live search", buckets=POLL_BUCKETS)
+
+CACHE_HIT_RATIO = REGISTRY.gauge(
+    "cache_hit_ratio", "Hit ratio of an in-process cache since start", ("cache",))
+CACHE_ENTRIES = REGISTRY.gauge(
+    "cache_entries", "Entries currently held by an in-process cache", ("cache",))
+
+
+def register_cache(name, cache):
+    """Export the hit ratio and size of a SearchCache under a cache label"""
+    CACHE_HIT_RATIO.labels(name).set_function(lambda: cache.stats()["hit_ratio"])
+    CACHE_ENTRIES.labels(name).set_function(lambda: cache.stats()["entries"])
@@ -1,3 +1,7 @@
+import random
+from datetime import datetime, timedelta
+
+
 def get_mock_flight_results():
     """Return mock flight search results for testing"""
     return {
@@ -227,3 +231,115 @@ def get_mock_flight_results():
             }
         }
     }
+
+
+CARRIERS = [("IB", "Iberia"), ("VY", "Vueling"), ("UX", "Air Europa"), ("FR", "Ryanair"),
+            ("U2", "easyJet"), ("AF", "Air France"), ("LH", "Lufthansa"), ("BA", "British Airways")]
+
+
+def _date_time(day, minutes):
+    moment = day + timedelta(minutes=minutes)
+    return {"year": moment.year, "month": moment.month, "day": moment.day,
+            "hour": moment.hour, "minute": moment.minute, "second": 0}
+
+
+def generate_flight_results(origin="MAD", destination="BCN", date="2023-12-25", itineraries=100,
+                            status="RESULT_STATUS_COMPLETE", seed=0):
+    """
+    Generate a live search response with the same shape as get_mock_flight_results
+    and an arbitrary number of itineraries (one leg and one to three segments each)
+    """
+    rng = random.Random(seed)
+    day = datetime.strptime(date, "%Y-%m-%d") if isinstance(date, str) else date
+    results = {
+        "itineraries": {}, "legs": {}, "segments": {},
+        "places": {
+            origin: {"name": origin, "type": "PLACE_TYPE_AIRPORT", "iata": origin},
+            destination: {"name": destination, "type": "PLACE_TYPE_AIRPORT", "iata": destination},
+        },
+        "carriers": {code: {"name": name, "displayCode": code} for code, name in CARRIERS},
+        "agents": {
+            f"agent-{i}": {"name": f"Agent {i}", "type": "AGENT_TYPE_TRAVEL_AGENT", "optimisedForMobile": True}
+            for i in range(20)
+        },
+    }
+    prices = []
+
+    for i in range(itineraries):
+        carrier = CARRIERS[rng.randrange(len(CARRIERS))][0]
+        stop_count = rng.choice((0, 0, 0, 1, 1, 2))
+        departure = rng.randrange(5 * 60, 23 * 60)
+        duration = 60 + rng.randrange(30, 120) + stop_count * rng.randrange(45, 240)
+        leg_id, segment_ids = f"leg-{i}", [f"segment-{i}-{s}" for s in range(stop_count + 1)]
+
+        for s, segment_id in enumerate(segment_ids):
+            results["segments"][segment_id] = {
+                "originPlaceId": origin if s == 0 else f"HUB{s}",
+                "destinationPlaceId": destination if s == stop_count else f"HUB{s + 1}",
+                "departureDateTime": _date_time(day, departure),
+                "arrivalDateTime": _date_time(day, departure + duration),
+                "durationInMinutes": duration // (stop_count + 1),
+                "flightNumber": f"{carrier}{rng.randrange(100, 9999)}",
+                "marketingCarrierId": carrier,
+                "operatingCarrierId": carrier,
+            }
+        results["legs"][leg_id] = {
+            "originPlaceId": origin,
+            "destinationPlaceId": destination,
+            "departureDateTime": _date_time(day, departure),
+            "arrivalDateTime": _date_time(day, departure + duration),
+            "durationInMinutes": duration,
+            "stopCount": stop_count,
+            "segmentIds": segment_ids,
+            "carriers": {"marketing": [carrier], "operating": [carrier]},
+            "directionality": "OUTBOUND",
+        }
+
+        pricing_options = []
+        for option in range(rng.randrange(1, 4)):
+            amount = round(rng.uniform(40, 400) - stop_count * 15 + option * 7, 2)
+            agent = f"agent-{rng.randrange(20)}"
+            prices.append(amount)
+            pricing_options.append({
+                "id": f"option-{i}-{option}",
+                "price": {"amount": amount, "unit": "EUR", "updateStatus": "PRICE_UPDATE_STATUS_COMPLETE"},
+                "agentIds": [agent],
+                "transferType": "TRANSFER_TYPE_MANAGED",
+                "items": [{"price": {"amount": amount, "unit": "EUR"}, "agentId": agent,
+                           "deepLink": f"https://example.com/booking/{i}/{option}"}],
+            })
+        results["itineraries"][f"itinerary-{i}"] = {"pricingOptions": pricing_options, "legIds": [leg_id]}
+
+    return {
+        "status": status,
+        "action": "RESULT_ACTION_REPLACED",
+        "sessionToken": "mock-session-token",
+        "content": {
+            "results": results,
+            "stats": {
+                "minPrice": {"amount": min(prices) if prices else None, "unit": "EUR"},
+                "maxPrice": {"amount": max(prices) if prices else None, "unit": "EUR"},
+                "itineraryCount": itineraries,
+            },
+        },
+    }
+
+
+def generate_indicative_results(origin, destination, start_date, end_date, seed=0):
+    """Generate an indicative search response with one quote per day between two dates"""
+    rng = random.Random(f"{seed}-{origin}-{destination}")
+    start = datetime.strptime(start_date, "%Y-%m-%d") if isinstance(start_date, str) else start_date
+    end = datetime.strptime(end_date, "%Y-%m-%d") if isinstance(end_date, str) else end_date
+    quotes = {}
+    for offset in range((end - start).days + 1):
+        day = start + timedelta(days=offset)
+        quotes[f"quote-{offset}"] = {
+            "minPrice": {"amount": str(rng.randrange(25, 350)), "unit": "PRICE_UNIT_WHOLE"},
+            "isDirect": rng.random() < 0.5,
+            "outboundLeg": {
+                "originPlaceId": origin,
+                "destinationPlaceId": destination,
+                "departureDateTime": {"year": day.year, "month": day.month, "day": day.day},
+            },
+        }
+    return {"status": "RESULT_STATUS_COMPLETE", "content": {"results": {"quotes": quotes}}}
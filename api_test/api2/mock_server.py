@@ -0,0 +1,187 @@
+"""
+Local stand-in for the Skyscanner flights API, for offline load and latency testing.
+
+Run it and point the client at it through config:
+
+    python mock_server.py --port 5001 --itineraries 10000 --latency lognormal --latency-ms 250
+    SKYSCANNER_API_BASE_URL=http://localhost:5001/apiservices python app.py
+"""
+import argparse
+import calendar
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+from functools import lru_cache
+from flask import Flask, Response, request
+import mock_data
+
+app = Flask(__name__)
+logger = logging.getLogger(__name__)
+
+settings = {
+    "itineraries": 500,          # Itineraries of a complete search
+    "polls_to_complete": 2,      # Polls answered INCOMPLETE before COMPLETE
+    "latency": "fixed",          # fixed | uniform | exponential | lognormal
+    "latency_ms": 0.0,           # Mean (median for lognormal) upstream latency
+    "latency_sigma": 0.5,        # Shape of the lognormal distribution
+    "error_rate_429": 0.0,       # Fraction of requests answered 429
+    "error_rate_5xx": 0.0,       # Fraction of requests answered 503
+}
+
+SESSION_TTL = 600  # Seconds a search session can be polled
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def sample_latency():
+    """Return a latency in seconds drawn from the configured distribution"""
+    mean = settings["latency_ms"] / 1000.0
+    kind = settings["latency"]
+    if mean <= 0:
+        return 0.0
+    if kind == "uniform":
+        return random.uniform(0, 2 * mean)
+    if kind == "exponential":
+        return random.expovariate(1 / mean)
+    if kind == "lognormal":
+        return random.lognormvariate(0, settings["latency_sigma"]) * mean
+    return mean
+
+
+def injected_error():
+    """Return an error response according to the configured rates, or None"""
+    roll = random.random()
+    if roll < settings["error_rate_429"]:
+        return json_response({"message": "Rate limit exceeded"}, status=429)
+    if roll < settings["error_rate_429"] + settings["error_rate_5xx"]:
+        return json_response({"message": "Service unavailable"}, status=503)
+    return None
+
+
+def json_response(body, status=200, headers=None):
+    payload = body if isinstance(body, bytes) else json.dumps(body).encode()
+    return Response(payload, status=status, mimetype="application/json", headers=headers)
+
+
+@lru_cache(maxsize=64)
+def live_payload(origin, destination, day, itineraries, stage, stages):
+    """
+    Serialized live search response for one stage of the INCOMPLETE → COMPLETE progression.
+    The session token travels in the x-session-token header, so payloads are shared by sessions.
+    """
+    complete = stage >= stages
+    count = itineraries if complete else max(1, itineraries * (stage + 1) // (stages + 1))
+    results = mock_data.generate_flight_results(
+        origin, destination, day, itineraries=count,
+        status="RESULT_STATUS_COMPLETE" if complete else "RESULT_STATUS_INCOMPLETE",
+    )
+    return json.dumps(results, separators=(",", ":")).encode()
+
+
+def simulate():
+    """Apply latency and error injection; return an error response or None"""
+    time.sleep(sample_latency())
+    return injected_error()
+
+
+@app.route('/apiservices/v3/flights/live/search/create', methods=['POST'])
+def create_search():
+    error = simulate()
+    if error:
+        return error
+
+    query = request.json.get("query", {})
+    leg = query.get("queryLegs", [{}])[0]
+    leg_date = leg.get("date", {})
+    day = date(leg_date.get("year", 2023), leg_date.get("month", 12), leg_date.get("day", 25)).isoformat()
+    search = {
+        "origin": leg.get("originPlaceId", {}).get("iata", "MAD"),
+        "destination": leg.get("destinationPlaceId", {}).get("iata", "BCN"),
+        "date": day,
+        "itineraries": settings["itineraries"],
+        "stages": settings["polls_to_complete"],
+        "polls": 0,
+        "created_at": time.monotonic(),
+    }
+    token = f"mock-{uuid.uuid4().hex}"
+    with _sessions_lock:
+        # Descartar sesiones antiguas para que la memoria no crezca en pruebas largas
+        for old_token in [t for t, s in _sessions.items() if search["created_at"] - s["created_at"] > SESSION_TTL]:
+            del _sessions[old_token]
+        _sessions[token] = search
+
+    body = live_payload(search["origin"], search["destination"], day, search["itineraries"], 0, search["stages"])
+    return json_response(body, headers={"x-session-token": token})
+
+
+@app.route('/apiservices/v3/flights/live/search/poll/<token>', methods=['POST'])
+def poll_search(token):
+    error = simulate()
+    if error:
+        return error
+
+    with _sessions_lock:
+        search = _sessions.get(token)
+        if search is None:
+            return json_response({"message": "Session not found"}, status=404)
+        search["polls"] += 1
+        stage = search["polls"]
+
+    body = live_payload(search["origin"], search["destination"], search["date"], search["itineraries"],
+                        min(stage, search["stages"]), search["stages"])
+    return json_response(body)
+
+
+@app.route('/apiservices/v3/flights/indicative/search', methods=['POST'])
+def indicative_search():
+    error = simulate()
+    if error:
+        return error
+
+    query = request.json.get("query", {})
+    leg = query.get("queryLegs", [{}])[0]
+    origin = leg.get("originPlace", {}).get("queryPlace", {}).get("iata", "MAD")
+    destination = leg.get("destinationPlace", {}).get("queryPlace", {}).get("iata", "BCN")
+    if "dateRange" in leg:
+        start, end = leg["dateRange"]["startDate"], leg["dateRange"]["endDate"]
+        start_day = date(start["year"], start["month"], 1)
+        end_day = date(end["year"], end["month"], calendar.monthrange(end["year"], end["month"])[1])
+    else:
+        start_day = date.today()
+        end_day = start_day + timedelta(days=30)
+
+    return json_response(mock_data.generate_indicative_results(origin, destination, start_day, end_day))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Servidor local que simula la API de Skyscanner')
+    parser.add_argument('--port', type=int, default=5001, help='Puerto (default: 5001)')
+    parser.add_argument('--itineraries', type=int, default=settings["itineraries"],
+                        help='Itinerarios de una búsqueda completa')
+    parser.add_argument('--polls', type=int, default=settings["polls_to_complete"],
+                        help='Polls con estado INCOMPLETE antes de COMPLETE')
+    parser.add_argument('--latency', choices=['fixed', 'uniform', 'exponential', 'lognormal'],
+                        default=settings["latency"], help='Distribución de la latencia')
+    parser.add_argument('--latency-ms', type=float, default=settings["latency_ms"],
+                        help='Latencia media (mediana en lognormal) en milisegundos')
+    parser.add_argument('--latency-sigma', type=float, default=settings["latency_sigma"],
+                        help='Sigma de la distribución lognormal')
+    parser.add_argument('--error-rate-429', type=float, default=0.0, help='Fracción de respuestas 429')
+    parser.add_argument('--error-rate-5xx', type=float, default=0.0, help='Fracción de respuestas 503')
+    args = parser.parse_args()
+
+    settings.update({
+        "itineraries": args.itineraries,
+        "polls_to_complete": args.polls,
+        "latency": args.latency,
+        "latency_ms": args.latency_ms,
+        "latency_sigma": args.latency_sigma,
+        "error_rate_429": args.error_rate_429,
+        "error_rate_5xx": args.error_rate_5xx,
+    })
+    logging.basicConfig(level=logging.INFO)
+    app.run(host='0.0.0.0', port=args.port, threaded=True)
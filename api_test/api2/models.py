@@ -3,7 +3,7 @@ import string
 import json
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, Integer, Boolean, DateTime, ForeignKey, Text
+from sqlalchemy import Column, String, Integer, BigInteger, Boolean, DateTime, ForeignKey, Text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from . import config
@@ -39,6 +39,13 @@ class Room(Base):
         }
 
 
+class RoomCodeSequence(Base):
+    __tablename__ = 'room_code_sequences'
+    
+    name = Column(String(50), primary_key=True)
+    next_value = Column(BigInteger, nullable=False, default=0)  # First counter value not yet reserved
+
+
 class Participant(Base):
     __tablename__ = 'participants'
     
@@ -97,6 +104,49 @@ class Response(Base):
         }
 
 
+class QuestionSet(Base):
+    __tablename__ = 'question_sets'
+    
+    # The id is the version: bit i of a ResponseVector refers to question_ids[i]
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    question_ids = Column(Text, nullable=False)  # JSON list of question ids
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    def get_question_ids(self):
+        return json.loads(self.question_ids)
+    
+    def set_question_ids(self, question_ids):
+        self.question_ids = json.dumps(list(question_ids))
+    
+    def to_dict(self):
+        return {
+            "version": self.id,
+            "question_ids": self.get_question_ids(),
+            "created_at": self.created_at.isoformat()
+        }
+
+
+class ResponseVector(Base):
+    __tablename__ = 'response_vectors'
+    
+    # One row per participant instead of one Response row per answer
+    participant_id = Column(String(36), ForeignKey('participants.id'), primary_key=True)
+    question_set_version = Column(Integer, ForeignKey('question_sets.id'), nullable=False)
+    answers_mask = Column(BigInteger, nullable=False, default=0)   # Bit set: answered Yes
+    answered_mask = Column(BigInteger, nullable=False, default=0)  # Bit set: question answered
+    
+    participant = relationship("Participant")
+    question_set = relationship("QuestionSet")
+    
+    def to_dict(self):
+        return {
+            "participant_id": self.participant_id,
+            "question_set_version": self.question_set_version,
+            "answers_mask": self.answers_mask,
+            "answered_mask": self.answered_mask
+        }
+
+
 class Destination(Base):
     __tablename__ = 'destinations'
     
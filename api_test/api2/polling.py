@@ -0,0 +1,113 @@
+import time
+import config
+
+STATUS_COMPLETE = "RESULT_STATUS_COMPLETE"
+STATUS_INCOMPLETE = "RESULT_STATUS_INCOMPLETE"
+ACTION_NOT_MODIFIED = "RESULT_ACTION_NOT_MODIFIED"
+
+
+def count_itineraries(results):
+    """Return the number of itineraries contained in a search/poll response"""
+    return len(results.get("content", {}).get("results", {}).get("itineraries", {}))
+
+
+def parse_deadline(value, default=None):
+    """
+    Read a client-supplied search deadline in seconds.
+
+    Returns `default` when the value is missing, clamps it to
+    SEARCH_MAX_DEADLINE and raises ValueError for non-numeric or
+    non-positive values.
+    """
+    if value is None or value == "":
+        return default
+    if isinstance(value, bool):
+        raise ValueError("Deadline must be a number of seconds")
+    try:
+        deadline = float(value)
+    except (TypeError, ValueError):
+        raise ValueError("Deadline must be a number of seconds")
+    if not deadline > 0:
+        raise ValueError("Deadline must be positive")
+    return min(deadline, config.SEARCH_MAX_DEADLINE)
+
+
+def parse_passengers(adults=1, children_ages=None):
+    """
+    Read client-supplied passenger counts: returns (adults, children_ages or None)
+    with integer values and raises ValueError for anything else.
+    """
+    if adults is None:
+        adults = 1
+    if isinstance(adults, bool) or not isinstance(adults, (int, str)):
+        raise ValueError("adults must be a positive integer")
+    try:
+        adults = int(adults)
+    except ValueError:
+        raise ValueError("adults must be a positive integer")
+    if adults < 1:
+        raise ValueError("adults must be a positive integer")
+
+    if not children_ages:
+        return adults, None
+    if not isinstance(children_ages, list):
+        raise ValueError("children_ages must be a list of ages")
+    ages = []
+    for age in children_ages:
+        if isinstance(age, bool) or not isinstance(age, (int, str)):
+            raise ValueError("children_ages must be a list of ages")
+        try:
+            age = int(age)
+        except ValueError:
+            raise ValueError("children_ages must be a list of ages")
+        if not 0 <= age <= 17:
+            raise ValueError("Children ages must be between 0 and 17")
+        ages.append(age)
+    return adults, ages
+
+
+class PollingStrategy:
+    """
+    Adaptive polling schedule for a live search bounded by an overall deadline.
+
+    The first poll happens after a short wait. While the upstream keeps
+    changing the results the interval stays at its minimum; every poll that
+    brings nothing new multiplies it by the backoff factor, up to a maximum.
+    All waits are clipped to the time left before the deadline.
+    """
+
+    def __init__(self, deadline=None, first_wait=None, min_interval=None,
+                 max_interval=None, backoff_factor=None, clock=time.monotonic):
+        self.clock = clock
+        self.started_at = clock()
+        self.deadline = config.SEARCH_DEADLINE if deadline is None else deadline
+        self.first_wait = config.POLL_FIRST_WAIT if first_wait is None else first_wait
+        self.min_interval = config.POLL_MIN_INTERVAL if min_interval is None else min_interval
+        self.max_interval = config.POLL_MAX_INTERVAL if max_interval is None else max_interval
+        self.backoff_factor = config.POLL_BACKOFF_FACTOR if backoff_factor is None else backoff_factor
+        self.polls = 0
+        self._interval = self.min_interval
+        self._last_count = None
+
+    def remaining(self):
+        """Seconds left before the deadline (never negative)"""
+        return max(0.0, self.deadline - (self.clock() - self.started_at))
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def observe(self, results):
+        """Record a create/poll response and adapt the next interval to it"""
+        count = count_itineraries(results)
+        changed = results.get("action") != ACTION_NOT_MODIFIED and count != self._last_count
+        if self._last_count is None or changed:
+            self._interval = self.min_interval
+        else:
+            self._interval = min(self.max_interval, self._interval * self.backoff_factor)
+        self._last_count = count
+
+    def next_wait(self):
+        """Seconds to wait before the next poll, clipped to the deadline"""
+        wait = self.first_wait if self.polls == 0 else self._interval
+        self.polls += 1
+        return min(wait, self.remaining())
@@ -0,0 +1,216 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+import config
+from search_state import cheapest_option
+
+logger = logging.getLogger(__name__)
+
+# Tamaño aproximado de una celda en la caché (evita serializarla)
+CELL_SIZE = 64
+
+
+def parse_date(value):
+    return datetime.strptime(value, "%Y-%m-%d").date() if isinstance(value, str) else value
+
+
+def date_window(start_date, end_date):
+    """Return every day between two dates (inclusive) as YYYY-MM-DD strings"""
+    start, end = parse_date(start_date), parse_date(end_date)
+    return [(start + timedelta(days=offset)).strftime("%Y-%m-%d") for offset in range((end - start).days + 1)]
+
+
+def price_amount(price):
+    """Return a Skyscanner price as a float in whole currency units, or None"""
+    if price.get("amount") is None:
+        return None
+    amount = float(price["amount"])
+    if price.get("unit") == "PRICE_UNIT_MILLI":
+        amount /= 1000
+    return amount
+
+
+def quote_amount(quote):
+    """Return the minimum price of an indicative quote as a float, or None"""
+    return price_amount(quote.get("minPrice", {}))
+
+
+def cheapest_by_date(results):
+    """Reduce an indicative search response to {YYYY-MM-DD: cheapest price}"""
+    prices = {}
+    quotes = results.get("content", {}).get("results", {}).get("quotes", {})
+    for quote in quotes.values():
+        amount = quote_amount(quote)
+        departure = quote.get("outboundLeg", {}).get("departureDateTime")
+        if amount is None or not departure:
+            continue
+        day = f"{departure['year']:04d}-{departure['month']:02d}-{departure['day']:02d}"
+        if day not in prices or amount < prices[day]:
+            prices[day] = amount
+    return prices
+
+
+def cell_key(origin, destination, day, market, currency):
+    return ("indicative", origin, destination, day, market, currency)
+
+
+async def fetch_route_prices(async_client, origin, destination, dates,
+                             market=config.DEFAULT_MARKET, locale=config.DEFAULT_LOCALE,
+                             currency=config.DEFAULT_CURRENCY):
+    """
+    Return ({day: price or None}, error, from_cache) for one route over a list of days.
+
+    Cached cells are reused; if any day is missing, the whole window is
+    fetched with a single indicative request and every day is cached,
+    including days without quotes (stored as None).
+    """
+    cache = async_client.sync_client.indicative_cache
+    prices = {}
+    if cache is not None:
+        for day in dates:
+            cell = cache.get(cell_key(origin, destination, day, market, currency))
+            if cell is None:
+                break
+            prices[day] = cell["price"]
+        else:
+            return prices, None, True
+
+    results = await async_client.get_indicative_prices(
+        origin, destination, dates[0], dates[-1], market=market, locale=locale, currency=currency
+    )
+    if "error" in results:
+        return {}, results["error"], False
+
+    by_date = cheapest_by_date(results)
+    prices = {day: by_date.get(day) for day in dates}
+    if cache is not None:
+        for day, price in prices.items():
+            cache.set(cell_key(origin, destination, day, market, currency), {"price": price}, size=CELL_SIZE)
+    return prices, None, False
+
+
+async def build_price_matrix(async_client, origins, destinations, start_date, end_date,
+                             market=config.DEFAULT_MARKET, locale=config.DEFAULT_LOCALE,
+                             currency=config.DEFAULT_CURRENCY):
+    """
+    Price every origin × destination × day combination.
+
+    One indicative request is made per route (not per day), routes run
+    concurrently under the async client's in-flight cap, and cached cells
+    are reused. The result is columnar: the "cells" columns hold indexes
+    into "origins", "destinations" and "dates" plus the price, and only
+    priced cells are listed.
+    """
+    origins = list(dict.fromkeys(o.upper() for o in origins))
+    destinations = list(dict.fromkeys(d.upper() for d in destinations))
+    dates = date_window(start_date, end_date)
+    routes = [(o, d) for o in origins for d in destinations if o != d]
+
+    route_results = await asyncio.gather(*(
+        fetch_route_prices(async_client, o, d, dates, market=market, locale=locale, currency=currency)
+        for o, d in routes
+    ))
+
+    origin_index = {o: i for i, o in enumerate(origins)}
+    destination_index = {d: i for i, d in enumerate(destinations)}
+    cells = {"origin": [], "destination": [], "date": [], "price": []}
+    errors = []
+    cached_routes = 0
+
+    for (origin, destination), (prices, error, from_cache) in zip(routes, route_results):
+        if error:
+            errors.append({"origin": origin, "destination": destination, "error": error})
+            continue
+        cached_routes += from_cache
+        for date_index, day in enumerate(dates):
+            price = prices.get(day)
+            if price is not None:
+                cells["origin"].append(origin_index[origin])
+                cells["destination"].append(destination_index[destination])
+                cells["date"].append(date_index)
+                cells["price"].append(price)
+
+    logger.info(f"Matriz de precios: {len(routes)} rutas, {cached_routes} desde caché, {len(errors)} errores")
+
+    return {
+        "origins": origins,
+        "destinations": destinations,
+        "dates": dates,
+        "currency": currency,
+        "cells": cells,
+        "errors": errors,
+        "stats": {
+            "routes": len(routes),
+            "cached_routes": cached_routes,
+            "upstream_requests": len(routes) - cached_routes,
+        },
+    }
+
+
+def cheapest_live_price(results):
+    """Return the cheapest itinerary price of a live search result (in whole units, like quotes), or None"""
+    itineraries = results.get("content", {}).get("results", {}).get("itineraries", {})
+    options = [option for option in map(cheapest_option, itineraries.values()) if option is not None]
+    prices = [price for price in (price_amount(option["price"]) for option in options) if price is not None]
+    return min(prices) if prices else None
+
+
+async def find_cheapest_days(async_client, origin, destination, start_date, end_date, confirm=3,
+                             market=config.DEFAULT_MARKET, locale=config.DEFAULT_LOCALE,
+                             currency=config.DEFAULT_CURRENCY, **search_kwargs):
+    """
+    Build a price calendar for a route and find its cheapest departure days.
+
+    The whole window is priced with one (cached) indicative request. Then up
+    to `confirm` days are checked with live searches, cheapest indicative
+    first, in concurrent waves; after each wave, days whose indicative price
+    is already above the best live price are pruned, since indicative prices
+    are treated as a lower bound of what a live search can return.
+    """
+    dates = date_window(start_date, end_date)
+    indicative, error, from_cache = await fetch_route_prices(
+        async_client, origin, destination, dates, market=market, locale=locale, currency=currency
+    )
+    calendar = {day: {"date": day, "indicative_price": indicative.get(day), "live_price": None} for day in dates}
+
+    candidates = sorted((day for day in dates if indicative.get(day) is not None), key=indicative.get)
+    best_live = None
+    checked = pruned = 0
+    while candidates and checked < confirm:
+        wave_size = min(async_client.max_in_flight, confirm - checked)
+        wave, candidates = candidates[:wave_size], candidates[wave_size:]
+        results = await asyncio.gather(*(
+            async_client.complete_search(origin, destination, day, market=market, locale=locale,
+                                         currency=currency, **search_kwargs)
+            for day in wave
+        ))
+        checked += len(wave)
+        for day, result in zip(wave, results):
+            if result and "error" not in result:
+                calendar[day]["live_price"] = price = cheapest_live_price(result)
+                if price is not None and (best_live is None or price < best_live):
+                    best_live = price
+        if best_live is not None:
+            remaining = [day for day in candidates if indicative[day] < best_live]
+            pruned += len(candidates) - len(remaining)
+            candidates = remaining
+
+    priced = [(entry["live_price"], "live", day) for day, entry in calendar.items() if entry["live_price"] is not None]
+    if not priced:
+        priced = [(price, "indicative", day) for day, price in indicative.items() if price is not None]
+    cheapest = min(priced) if priced else None
+
+    return {
+        "origin": origin,
+        "destination": destination,
+        "currency": currency,
+        "days": list(calendar.values()),
+        "cheapest": {"date": cheapest[2], "price": cheapest[0], "source": cheapest[1]} if cheapest else None,
+        "errors": [error] if error else [],
+        "stats": {
+            "days": len(dates),
+            "indicative_cached": from_cache,
+            "live_searches": checked,
+            "pruned_days": pruned,
+        },
+    }
@@ -0,0 +1,154 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from io import BytesIO
+
+# Lo importan app.py (como qr_service) y room_manager.py (como api2.qr_service):
+# en ambos casos se usa el config.py de este directorio
+try:
+    from . import config
+except ImportError:
+    import config
+
+FORMAT_PNG = "png"
+FORMAT_SVG = "svg"
+CONTENT_TYPES = {FORMAT_PNG: "image/png", FORMAT_SVG: "image/svg+xml"}
+
+
+class QRRenderTimeout(Exception):
+    """Raised when a QR image is not rendered within QR_RENDER_TIMEOUT seconds"""
+
+
+def qr_cache_key(data, box_size, fmt):
+    """Content address of a rendered QR image: sha256 of (data, size, format)"""
+    return hashlib.sha256(f"{fmt}\0{box_size}\0{data}".encode("utf-8")).hexdigest()
+
+
+def render_qr(data, box_size, fmt):
+    """Render data as a QR code image and return its bytes"""
+    # qrcode (y PIL para PNG) solo se necesita al renderizar
+    import qrcode
+
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=box_size,
+        border=4,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+
+    if fmt == FORMAT_SVG:
+        from qrcode.image.svg import SvgPathImage
+        img = qr.make_image(image_factory=SvgPathImage)
+    else:
+        img = qr.make_image(fill_color="black", back_color="white")
+    buffered = BytesIO()
+    img.save(buffered)
+    return buffered.getvalue()
+
+
+class QRCodeService:
+    """
+    Render QR codes on a worker pool and keep the results in a content-addressed LRU cache.
+
+    Images are keyed by qr_cache_key(data, box_size, format), which doubles as
+    their ETag. Concurrent requests for an image that is still rendering wait
+    for the same render instead of starting another one.
+    """
+
+    def __init__(self, max_entries=None, workers=None):
+        self.max_entries = max_entries or config.QR_CACHE_MAX_ENTRIES
+        self._executor = ThreadPoolExecutor(max_workers=workers or config.QR_RENDER_WORKERS,
+                                            thread_name_prefix="qr-render")
+        self._images = OrderedDict()  # key -> bytes
+        self._pending = {}  # key -> Future of a render in progress
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.renders = 0
+
+    def _validate(self, box_size, fmt):
+        if fmt not in CONTENT_TYPES:
+            raise ValueError(f"Unsupported QR format: {fmt}")
+        if not 1 <= box_size <= config.QR_MAX_BOX_SIZE:
+            raise ValueError(f"QR size must be between 1 and {config.QR_MAX_BOX_SIZE}")
+
+    def submit(self, data, box_size=None, fmt=FORMAT_PNG):
+        """Return (key, future of the image bytes), rendering on the pool only on a cache miss"""
+        box_size = box_size or config.QR_DEFAULT_BOX_SIZE
+        self._validate(box_size, fmt)
+        key = qr_cache_key(data, box_size, fmt)
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+                self.hits += 1
+                future = Future()
+                future.set_result(image)
+                return key, future
+            self.misses += 1
+            future = self._pending.get(key)
+            if future is None:
+                future = self._executor.submit(self._render, key, data, box_size, fmt)
+                self._pending[key] = future
+        return key, future
+
+    def _render(self, key, data, box_size, fmt):
+        try:
+            image = render_qr(data, box_size, fmt)
+        except BaseException:
+            with self._lock:
+                self._pending.pop(key, None)
+            raise
+        with self._lock:
+            self.renders += 1
+            self._images[key] = image
+            self._images.move_to_end(key)
+            self._pending.pop(key, None)
+            while len(self._images) > self.max_entries:
+                self._images.popitem(last=False)
+        return image
+
+    def render(self, data, box_size=None, fmt=FORMAT_PNG, timeout=None):
+        """
+        Return (image bytes, etag), waiting up to `timeout` seconds (QR_RENDER_TIMEOUT)
+        for the worker pool on a cache miss; raise QRRenderTimeout otherwise.
+
+        A render that times out keeps running and its image is still cached.
+        """
+        key, future = self.submit(data, box_size, fmt)
+        try:
+            return future.result(timeout=config.QR_RENDER_TIMEOUT if timeout is None else timeout), key
+        except FutureTimeoutError:
+            raise QRRenderTimeout("QR code rendering timed out") from None
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._images),
+                "bytes": sum(len(image) for image in self._images.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "renders": self.renders,
+                "rendering": len(self._pending),
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_qr_service():
+    """
+    Return the process-wide QR code service, creating it on first use
+    """
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = QRCodeService()
+    return _service
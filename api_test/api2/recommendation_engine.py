@@ -1,13 +1,42 @@
+import threading
 from collections import defaultdict
 from datetime import datetime, timedelta
 from sqlalchemy import func
 from . import models
+from . import config
+from . import answer_vectors
 from .skyscanner_api import SkyscannerApiClient
+from .search_cache import SearchCache
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_client():
+    """
+    Return the process-wide client used when no client is given, creating it on first use.
+
+    It has its own search and indicative caches, so the live searches of a
+    price calendar are reused by the final flight search and by later
+    recommendations for the same route.
+    """
+    global _default_client
+    if _default_client is None:
+        with _default_client_lock:
+            if _default_client is None:
+                _default_client = SkyscannerApiClient(
+                    cache=SearchCache(),
+                    indicative_cache=SearchCache(ttl=config.INDICATIVE_CACHE_TTL,
+                                                 max_entries=config.INDICATIVE_CACHE_MAX_ENTRIES),
+                )
+    return _default_client
+
 
 class RecommendationEngine:
-    def __init__(self, db_session):
+    def __init__(self, db_session, skyscanner_client=None):
         self.db_session = db_session
-        self.skyscanner_client = SkyscannerApiClient()
+        # The client needs a search cache to reuse results across recommendations
+        self.skyscanner_client = skyscanner_client or get_default_client()
     
     def analyze_room_responses(self, room_id):
         """Analyze responses from all participants in a room"""
@@ -16,26 +45,18 @@ class RecommendationEngine:
             return {"error": "Room not found"}
         
         # Get all participants in the room
-        participants = room.participants
-        if not participants:
+        participant_ids = [
+            participant_id for participant_id, in
+            self.db_session.query(models.Participant.id).filter_by(room_id=room_id)
+        ]
+        if not participant_ids:
             return {"error": "No participants found in room"}
         
-        # Get all responses from all participants
-        participant_ids = [p.id for p in participants]
-        all_responses = self.db_session.query(models.Response).filter(
-            models.Response.participant_id.in_(participant_ids)
-        ).all()
-        
-        # Group responses by question
-        question_responses = defaultdict(list)
-        for response in all_responses:
-            question_responses[response.question_id].append(response.answer)
-        
-        # Find questions where everyone answered 'Yes'
-        common_yes_questions = []
-        for question_id, answers in question_responses.items():
-            if len(answers) == len(participants) and all(answers):
-                common_yes_questions.append(question_id)
+        if config.RESPONSE_STORAGE == "bitmask":
+            # One packed vector per participant, intersected with a bitwise AND
+            common_yes_questions = answer_vectors.unanimous_yes_question_ids(self.db_session, participant_ids)
+        else:
+            common_yes_questions = self._unanimous_yes_from_rows(participant_ids)
         
         # Get the question details for the common 'Yes' questions
         common_questions = self.db_session.query(models.Question).filter(
@@ -52,6 +73,23 @@ class RecommendationEngine:
             "category_preferences": dict(category_counts)
         }
     
+    def _unanimous_yes_from_rows(self, participant_ids):
+        # Get all responses from all participants
+        all_responses = self.db_session.query(models.Response).filter(
+            models.Response.participant_id.in_(participant_ids)
+        ).all()
+        
+        # Group responses by question
+        question_responses = defaultdict(list)
+        for response in all_responses:
+            question_responses[response.question_id].append(response.answer)
+        
+        # Find questions where everyone answered 'Yes'
+        return [
+            question_id for question_id, answers in question_responses.items()
+            if len(answers) == len(participant_ids) and all(answers)
+        ]
+    
     def find_matching_destinations(self, category_preferences):
         """Find destinations that match the category preferences"""
         # In a real application, you would have a more sophisticated matching algorithm
@@ -100,14 +138,27 @@ class RecommendationEngine:
         
         # Find flights to this destination (if it has an IATA code)
         flights_info = {}
+        price_calendar = None
         if top_match.get("iata_code"):
             # In a real application, you would determine the origin dynamically
             # This is just an example with a hardcoded origin
             origin = "MAD"  # Madrid
             destination = top_match["iata_code"]
             
-            # Search flights for a month from now (as an example)
-            future_date = (datetime.now() + timedelta(days=30)).strftime("%Y-%m-%d")
+            # Search flights around a month from now, on the cheapest day of the window
+            target_date = datetime.now() + timedelta(days=config.RECOMMENDATION_DAYS_AHEAD)
+            future_date = target_date.strftime("%Y-%m-%d")
+            if config.RECOMMENDATION_FLEX_DAYS:
+                flex = timedelta(days=config.RECOMMENDATION_FLEX_DAYS)
+                price_calendar = self.skyscanner_client.cheapest_days(
+                    origin, destination,
+                    (target_date - flex).strftime("%Y-%m-%d"),
+                    (target_date + flex).strftime("%Y-%m-%d")
+                )
+                if price_calendar.get("cheapest"):
+                    future_date = price_calendar["cheapest"]["date"]
+            
+            # With a search cache, the calendar's live search for this day is reused
             flights = self.skyscanner_client.complete_search(origin, destination, future_date)
             
             if "error" not in flights:
@@ -117,9 +168,37 @@ class RecommendationEngine:
             "destination": top_match,
             "category_matches": analysis["category_preferences"],
             "flights": flights_info,
+            "price_calendar": price_calendar,
             "other_recommendations": [m["destination"] for m in matches[1:]]
         }
     
+    def popular_routes(self, origin="MAD", limit=20):
+        """
+        Routes most likely to be searched next, for the background cache warmer:
+        recently recommended destinations first, then every destination with an IATA code
+        """
+        future_date = (datetime.now() + timedelta(days=config.RECOMMENDATION_DAYS_AHEAD)).strftime("%Y-%m-%d")
+        
+        recent_names = [
+            name for (name,) in self.db_session.query(models.Room.recommended_destination)
+            .filter(models.Room.recommended_destination.isnot(None))
+            .order_by(models.Room.created_at.desc())
+            .limit(limit)
+        ]
+        iata_by_name = dict(
+            self.db_session.query(models.Destination.name, models.Destination.iata_code)
+            .filter(models.Destination.iata_code.isnot(None))
+        )
+        
+        iata_codes = [iata_by_name[name] for name in recent_names if name in iata_by_name]
+        iata_codes += sorted(iata_by_name.values())
+        
+        routes = []
+        for iata in dict.fromkeys(iata_codes):
+            if iata != origin:
+                routes.append({"origin": origin, "destination": iata, "date": future_date})
+        return routes[:limit]
+    
     def load_sample_questions(self):
         """Load sample questions for testing"""
         sample_questions = [
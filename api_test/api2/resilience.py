@@ -0,0 +1,178 @@
+import threading
+import time
+import config
+
+
+class UpstreamUnavailable(Exception):
+    """Raised when a request is not sent because of rate limiting or an open circuit"""
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter.
+
+    Tokens refill continuously at `rate` per second up to `burst`. Each
+    upstream request takes one token; callers may wait up to a timeout.
+    """
+
+    def __init__(self, rate=None, burst=None, clock=time.monotonic):
+        self.rate = rate or config.RATE_LIMIT_PER_SECOND
+        self.burst = burst or config.RATE_LIMIT_BURST
+        self.clock = clock
+        self._tokens = float(self.burst)
+        self._updated_at = clock()
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.throttled = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+
+    def _refill(self):
+        now = self.clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def try_acquire(self):
+        """Take a token if one is available right now"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                self.acquired += 1
+                return True
+            return False
+
+    def acquire(self, timeout=None):
+        """Take a token, waiting up to `timeout` seconds; return False if none arrived"""
+        timeout = config.RATE_LIMIT_MAX_WAIT if timeout is None else timeout
+        started_at = self.clock()
+        waited = False
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    self.acquired += 1
+                    if waited:
+                        self.throttled += 1
+                        self.wait_seconds += self.clock() - started_at
+                    return True
+                shortfall = (1 - self._tokens) / self.rate
+            remaining = timeout - (self.clock() - started_at)
+            if shortfall > remaining:
+                with self._lock:
+                    self.rejected += 1
+                return False
+            waited = True
+            time.sleep(shortfall)
+
+    def available(self):
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def stats(self):
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "available_tokens": round(self.available(), 2),
+            "acquired": self.acquired,
+            "throttled": self.throttled,
+            "rejected": self.rejected,
+            "wait_seconds": round(self.wait_seconds, 3),
+        }
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for an upstream service.
+
+    After `failure_threshold` consecutive failures the circuit opens and
+    requests fail fast. Once `recovery_timeout` seconds have passed it turns
+    half-open and lets a limited number of probe requests through: a
+    successful probe closes it again, a failed one re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=None, recovery_timeout=None, half_open_probes=None,
+                 clock=time.monotonic):
+        self.failure_threshold = failure_threshold or config.BREAKER_FAILURE_THRESHOLD
+        self.recovery_timeout = config.BREAKER_RECOVERY_TIMEOUT if recovery_timeout is None else recovery_timeout
+        self.half_open_probes = half_open_probes or config.BREAKER_HALF_OPEN_PROBES
+        self.clock = clock
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._probes = 0
+        self._lock = threading.Lock()
+        self.times_opened = 0
+        self.rejected = 0
+        self.successes = 0
+        self.failures_total = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == self.OPEN and self.clock() - self._opened_at >= self.recovery_timeout:
+            self._state = self.HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    def fail_fast(self):
+        """Return True (and count a rejection) if the circuit is open right now"""
+        with self._lock:
+            if self._current_state() == self.OPEN:
+                self.rejected += 1
+                return True
+            return False
+
+    def allow_request(self):
+        """Return True if a request may be sent now"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and self._probes < self.half_open_probes:
+                self._probes += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def release_probe(self):
+        """Give back a half-open probe slot taken by allow_request for a request never sent"""
+        with self._lock:
+            if self._state == self.HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def record_success(self):
+        with self._lock:
+            self.successes += 1
+            self._failures = 0
+            self._state = self.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self.failures_total += 1
+            self._failures += 1
+            state = self._current_state()
+            if state == self.HALF_OPEN or (state == self.CLOSED and self._failures >= self.failure_threshold):
+                self._state = self.OPEN
+                self._opened_at = self.clock()
+                self.times_opened += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self._current_state(),
+                "consecutive_failures": self._failures,
+                "times_opened": self.times_opened,
+                "rejected": self.rejected,
+                "successes": self.successes,
+                "failures": self.failures_total,
+            }
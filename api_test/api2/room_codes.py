@@ -0,0 +1,127 @@
+import hashlib
+import string
+import threading
+from sqlalchemy.exc import IntegrityError
+from . import config
+from . import models
+
+ALPHABET = string.ascii_uppercase + string.digits
+SEQUENCE_NAME = "room_code"
+FEISTEL_ROUNDS = 4
+
+
+class CodePermutation:
+    """
+    Keyed bijection of [0, size) used to turn a counter into random-looking codes.
+
+    A balanced Feistel network permutes the smallest even-width bit domain
+    that covers `size`; values that land outside the range are encrypted
+    again (cycle walking), which keeps the mapping a permutation of exactly
+    [0, size). Distinct counters therefore always give distinct codes.
+    """
+
+    def __init__(self, size, secret, rounds=FEISTEL_ROUNDS):
+        self.size = size
+        self.half_bits = (max(size - 1, 1).bit_length() + 1) // 2
+        self.mask = (1 << self.half_bits) - 1
+        self.rounds = rounds
+        self.key = hashlib.blake2b(secret.encode("utf-8"), digest_size=32).digest()
+
+    def _round(self, number, value):
+        digest = hashlib.blake2b(number.to_bytes(1, "big") + value.to_bytes(8, "big"),
+                                 key=self.key, digest_size=8).digest()
+        return int.from_bytes(digest, "big") & self.mask
+
+    def _encrypt(self, value):
+        left, right = value >> self.half_bits, value & self.mask
+        for number in range(self.rounds):
+            left, right = right, left ^ self._round(number, right)
+        return (left << self.half_bits) | right
+
+    def permute(self, value):
+        if not 0 <= value < self.size:
+            raise ValueError(f"Value {value} outside the permutation range")
+        value = self._encrypt(value)
+        while value >= self.size:
+            value = self._encrypt(value)
+        return value
+
+
+def encode_code(value, length=None):
+    """Write a number as a fixed-length code over ALPHABET"""
+    length = length or config.ROOM_CODE_LENGTH
+    chars = []
+    for _ in range(length):
+        value, digit = divmod(value, len(ALPHABET))
+        chars.append(ALPHABET[digit])
+    return "".join(reversed(chars))
+
+
+class RoomCodeAllocator:
+    """
+    Hand out unique room codes without checking the rooms table.
+
+    Codes are the keyed permutation of a counter. Counter values are reserved
+    from the room_code_sequences table in blocks of `block_size` with a single
+    atomic UPDATE, so processes sharing the database never receive the same
+    value and most codes need no database access at all. Values of a block
+    that are not used before the process exits are simply skipped. The unique
+    constraint on Room.code remains as a backstop (see RoomManager.create_room).
+    """
+
+    def __init__(self, secret=None, length=None, block_size=None):
+        self.length = length or config.ROOM_CODE_LENGTH
+        self.block_size = block_size or config.ROOM_CODE_BLOCK_SIZE
+        self.permutation = CodePermutation(len(ALPHABET) ** self.length, secret or config.ROOM_CODE_SECRET)
+        self._next = 0
+        self._end = 0
+        self._lock = threading.Lock()
+
+    def _reserve_block(self, db_session):
+        """Reserve the next block of counter values; commits the session"""
+        Sequence = models.RoomCodeSequence
+        while True:
+            updated = db_session.query(Sequence).filter_by(name=SEQUENCE_NAME).update(
+                {Sequence.next_value: Sequence.next_value + self.block_size}, synchronize_session=False
+            )
+            if updated:
+                end = db_session.query(Sequence.next_value).filter_by(name=SEQUENCE_NAME).scalar()
+                db_session.commit()
+                break
+            # Primera reserva: otro proceso puede crear la fila a la vez
+            db_session.add(Sequence(name=SEQUENCE_NAME, next_value=self.block_size))
+            try:
+                db_session.commit()
+                end = self.block_size
+                break
+            except IntegrityError:
+                db_session.rollback()
+
+        if end > self.permutation.size:
+            raise RuntimeError("Room code space exhausted")
+        self._next, self._end = end - self.block_size, end
+
+    def next_code(self, db_session):
+        """Return a code never handed out before by any allocator sharing the database"""
+        with self._lock:
+            if self._next >= self._end:
+                self._reserve_block(db_session)
+            value = self._next
+            self._next += 1
+        return encode_code(self.permutation.permute(value), self.length)
+
+
+_allocator = None
+_allocator_lock = threading.Lock()
+
+
+def get_allocator():
+    """
+    Return the process-wide room code allocator, creating it on first use
+    """
+    global _allocator
+    if _allocator is None:
+        with _allocator_lock:
+            if _allocator is None:
+                _allocator = RoomCodeAllocator()
+    return _allocator
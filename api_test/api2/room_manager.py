@@ -1,26 +1,33 @@
-import qrcode
-from io import BytesIO
 import base64
+import uuid
+from sqlalchemy import Integer, cast, func
 from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
 from . import models
+from . import config
+from . import answer_vectors
+from .room_codes import get_allocator
+from .qr_service import get_qr_service, QRRenderTimeout
 
 class RoomManager:
-    def __init__(self, db_session):
+    def __init__(self, db_session, code_allocator=None):
         self.db_session = db_session
+        self.code_allocator = code_allocator or get_allocator()
     
     def create_room(self, admin_id):
         """Create a new room with a unique code"""
-        # Generate a unique code
-        while True:
-            code = models.Room.generate_room_code()
-            existing = self.db_session.query(models.Room).filter_by(code=code).first()
-            if not existing:
-                break
+        # Codes come from the allocator, no lookup needed; the unique
+        # constraint only guards against random codes from older rooms or another secret
+        for attempt in range(config.ROOM_CODE_MAX_ATTEMPTS):
+            room = models.Room(code=self.code_allocator.next_code(self.db_session), admin_id=admin_id)
+            self.db_session.add(room)
+            try:
+                self.db_session.commit()
+                return room
+            except IntegrityError:
+                self.db_session.rollback()
         
-        room = models.Room(code=code, admin_id=admin_id)
-        self.db_session.add(room)
-        self.db_session.commit()
-        return room
+        raise RuntimeError("Could not allocate a unique room code")
     
     def get_room_by_code(self, code):
         """Get a room by its code"""
@@ -35,56 +42,86 @@ class RoomManager:
     
     def submit_responses(self, participant_id, responses):
         """Submit a participant's responses to questions"""
-        participant = self.db_session.query(models.Participant).filter_by(id=participant_id).first()
+        # Constant number of round trips: the answers are written with one
+        # statement (see RESPONSE_STORAGE) and completion comes from one
+        # aggregate query
+        participant = self.db_session.query(models.Participant.room_id).filter_by(id=participant_id).first()
         if not participant:
             return {"error": "Participant not found"}
+        room_id = participant.room_id
         
-        # Delete any existing responses from this participant
-        self.db_session.query(models.Response).filter_by(participant_id=participant_id).delete()
-        
-        # Add new responses
-        for question_id, answer in responses.items():
-            response = models.Response(
-                participant_id=participant_id,
-                question_id=question_id,
-                answer=answer
-            )
-            self.db_session.add(response)
+        if config.RESPONSE_STORAGE == "bitmask":
+            error = self._store_response_vector(participant_id, responses)
+            if error:
+                return error
+        else:
+            self._store_response_rows(participant_id, responses)
         
         # Mark participant as completed
-        participant.has_completed = True
+        self.db_session.query(models.Participant).filter_by(id=participant_id).update(
+            {models.Participant.has_completed: True}, synchronize_session=False
+        )
         self.db_session.commit()
         
         # Check if all participants have completed
-        room = participant.room
-        all_completed = all(p.has_completed for p in room.participants)
+        total, completed = self.db_session.query(
+            func.count(models.Participant.id),
+            func.coalesce(func.sum(cast(models.Participant.has_completed, Integer)), 0)
+        ).filter_by(room_id=room_id).one()
         
         return {
             "success": True, 
-            "all_completed": all_completed
+            "all_completed": completed == total
         }
     
-    def generate_qr_code(self, room_code, base_url="http://yourapp.com/join/"):
-        """Generate a QR code for room invitation"""
-        join_url = f"{base_url}{room_code}"
-        
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
+    def _store_response_rows(self, participant_id, responses):
+        # Replace any existing responses from this participant
+        self.db_session.query(models.Response).filter_by(participant_id=participant_id).delete(
+            synchronize_session=False
         )
-        qr.add_data(join_url)
-        qr.make(fit=True)
+        if responses:
+            self.db_session.execute(models.Response.__table__.insert(), [
+                {
+                    "id": str(uuid.uuid4()),
+                    "participant_id": participant_id,
+                    "question_id": question_id,
+                    "answer": answer
+                }
+                for question_id, answer in responses.items()
+            ])
+    
+    def _store_response_vector(self, participant_id, responses):
+        # All answers of the participant packed into one row; the question set
+        # follows the questions table, so only truly unknown ids are rejected
+        try:
+            question_set = answer_vectors.current_question_set(self.db_session)
+            answers_mask, answered_mask = answer_vectors.pack_answers(question_set.get_question_ids(), responses)
+        except ValueError as e:
+            return {"error": str(e)}
         
-        img = qr.make_image(fill_color="black", back_color="white")
-        buffered = BytesIO()
-        img.save(buffered)
-        img_str = base64.b64encode(buffered.getvalue()).decode()
+        self.db_session.merge(models.ResponseVector(
+            participant_id=participant_id,
+            question_set_version=question_set.id,
+            answers_mask=answers_mask,
+            answered_mask=answered_mask
+        ))
+        return None
+    
+    def generate_qr_code(self, room_code, base_url=None):
+        """Generate a QR code for room invitation"""
+        # Rendered on the QR service pool and cached; clients can also load
+        # the image directly from qr_code_url (GET /api/rooms/<code>/qr)
+        join_url = f"{base_url or config.JOIN_BASE_URL}{room_code}"
+        try:
+            image, _ = get_qr_service().render(join_url)
+        except QRRenderTimeout as e:
+            return {"error": str(e)}
+        img_str = base64.b64encode(image).decode()
         
         return {
             "url": join_url,
-            "qr_code_base64": img_str
+            "qr_code_base64": img_str,
+            "qr_code_url": f"/api/rooms/{room_code}/qr"
         }
     
     def check_room_status(self, room_id):
@@ -0,0 +1,200 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import date as date_type, datetime
+import config
+
+
+def make_search_key(origin, destination, date, adults=1, children_ages=None,
+                    market=config.DEFAULT_MARKET, locale=config.DEFAULT_LOCALE,
+                    currency=config.DEFAULT_CURRENCY, cabin_class="CABIN_CLASS_ECONOMY"):
+    """
+    Build the normalized cache key of a flight search query
+    """
+    if isinstance(date, (datetime, date_type)):
+        date = date.strftime("%Y-%m-%d")
+    return (
+        origin.strip().upper(),
+        destination.strip().upper(),
+        str(date),
+        int(adults),
+        tuple(sorted(int(age) for age in children_ages or ())),
+        market.upper(),
+        locale,
+        currency.upper(),
+        cabin_class,
+    )
+
+
+# Tamaño medio serializado de cada entidad de una respuesta de búsqueda
+ENTITY_BYTES = {
+    "itineraries": 700,
+    "legs": 450,
+    "segments": 400,
+    "places": 100,
+    "carriers": 100,
+    "agents": 100,
+}
+BASE_SIZE = 512
+
+
+def estimate_size(value):
+    """
+    Approximate the memory footprint of a cached search result.
+
+    The size comes from the number of entities per section instead of
+    serializing the result, which would cost hundreds of milliseconds for
+    large searches on the request thread.
+    """
+    results = value.get("content", {}).get("results") if isinstance(value, dict) else None
+    if not isinstance(results, dict):
+        return BASE_SIZE
+    return BASE_SIZE + sum(len(results.get(section) or ()) * size for section, size in ENTITY_BYTES.items())
+
+
+class SearchCache:
+    """
+    Thread-safe in-process TTL + LRU cache for search results.
+
+    Entries expire `ttl` seconds after being stored; expired entries are no
+    longer returned by get() but stay available to get_stale() until evicted,
+    and to lookup() (stale-while-revalidate) until `hard_ttl`.
+    When the number of entries or their approximate total size exceeds the
+    budget, the least recently used entries are evicted.
+    """
+
+    def __init__(self, ttl=None, max_entries=None, max_bytes=None, clock=time.monotonic, hard_ttl=None):
+        self.ttl = config.SEARCH_CACHE_TTL if ttl is None else ttl
+        self.hard_ttl = max(self.ttl, config.SEARCH_CACHE_HARD_TTL if hard_ttl is None else hard_ttl)
+        self.max_entries = max_entries or config.SEARCH_CACHE_MAX_ENTRIES
+        self.max_bytes = max_bytes or config.SEARCH_CACHE_MAX_BYTES
+        self.clock = clock
+        self._entries = OrderedDict()  # key -> (value, stored_at, size)
+        self._warmed = set()  # keys stored by the background cache warmer
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.warm_hits = 0
+        self.stale_hits = 0
+
+    def get(self, key):
+        """Return the cached value for key, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, stored_at, _ = entry
+            if self.clock() - stored_at > self.ttl:
+                # Se conserva hasta que el LRU lo expulse: get_stale aún puede servirlo
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            if key in self._warmed:
+                self.warm_hits += 1
+            return value
+
+    def peek(self, key):
+        """Return the fresh cached value for key without touching counters or LRU order"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self.clock() - entry[1] > self.ttl:
+                return None
+            return entry[0]
+
+    def lookup(self, key):
+        """
+        Return (value, age) for stale-while-revalidate serving, or (None, None).
+
+        Entries up to `ttl` seconds old count as hits, entries between `ttl`
+        and `hard_ttl` as stale hits (the caller should refresh them), and
+        older or missing entries as misses.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            age = None if entry is None else self.clock() - entry[1]
+            if entry is None or age > self.hard_ttl:
+                self.misses += 1
+                return None, None
+            self._entries.move_to_end(key)
+            if age > self.ttl:
+                self.stale_hits += 1
+            else:
+                self.hits += 1
+                if key in self._warmed:
+                    self.warm_hits += 1
+            return entry[0], age
+
+    def get_stale(self, key):
+        """Return the cached value for key even if it has expired (None if evicted)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[0] if entry is not None else None
+
+    def age(self, key):
+        """Seconds since key was stored (None if absent), without touching counters or LRU order"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return None if entry is None else self.clock() - entry[1]
+
+    def mark_warmed(self, key):
+        """Flag an entry as pre-computed by the cache warmer, to measure warm hits"""
+        with self._lock:
+            if key in self._entries:
+                self._warmed.add(key)
+
+    def set(self, key, value, size=None):
+        """Store a value, evicting least recently used entries if over budget"""
+        size = estimate_size(value) if size is None else size
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, self.clock(), size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._warmed.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._warmed.discard(key)
+        self._bytes -= size
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """Return hit/miss/eviction counters and current usage"""
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "warm_hits": self.warm_hits,
+                "warm_hit_ratio": self.warm_hits / lookups if lookups else 0.0,
+            }
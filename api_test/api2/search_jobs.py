@@ -0,0 +1,171 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import config
+
+logger = logging.getLogger(__name__)
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_COMPLETE = "complete"
+JOB_FAILED = "failed"
+
+
+class JobQueueFull(Exception):
+    """Raised when too many search jobs are already waiting or running"""
+
+
+class SearchJob:
+    """
+    A flight search running in the background, with its partial results
+    """
+
+    def __init__(self, job_id, query, clock=time.monotonic):
+        self.id = job_id
+        self.query = query
+        self.clock = clock
+        self.status = JOB_PENDING
+        self.created_at = clock()
+        self.finished_at = None
+        self.poll = 0
+        self.version = 0
+        self.cheapest = None
+        self.itineraries = {}
+        self.legs = {}
+        self.result = None
+        self.error = None
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self):
+        return self.status in (JOB_COMPLETE, JOB_FAILED)
+
+    def start(self):
+        with self._lock:
+            self.status = JOB_RUNNING
+
+    def update(self, batch):
+        """Merge a SearchState.batch into the partial results"""
+        with self._lock:
+            self.poll = batch["poll"]
+            self.version = batch["version"]
+            self.cheapest = batch["cheapest"]
+            self.itineraries.update(batch["itineraries"])
+            self.legs.update(batch["legs"])
+
+    def finish(self, result=None, error=None):
+        with self._lock:
+            if error is None and result is not None and "error" in result:
+                error, result = result["error"], None
+            self.result = result
+            self.error = error
+            self.status = JOB_FAILED if error is not None else JOB_COMPLETE
+            self.finished_at = self.clock()
+            # El resultado final sustituye a los parciales
+            self.itineraries, self.legs = {}, {}
+
+    def snapshot(self):
+        """Return the job status with partial itineraries, or its final result"""
+        with self._lock:
+            snapshot = {
+                "job_id": self.id,
+                "status": self.status,
+                "query": self.query,
+                "elapsed": round((self.finished_at or self.clock()) - self.created_at, 3),
+            }
+            if self.status == JOB_COMPLETE:
+                snapshot["result"] = self.result
+            elif self.status == JOB_FAILED:
+                snapshot["error"] = self.error
+            else:
+                snapshot.update({
+                    "poll": self.poll,
+                    "version": self.version,
+                    "cheapest": self.cheapest,
+                    "itinerary_count": len(self.itineraries),
+                    "itineraries": dict(self.itineraries),
+                    "legs": dict(self.legs),
+                })
+            return snapshot
+
+
+class SearchJobManager:
+    """
+    Run flight searches on a bounded thread pool and keep their progress by job id.
+
+    submit() returns immediately with a job; the search runs through
+    SkyscannerApiClient.complete_search (cache, coalescing and deadline
+    included) and reports every upstream poll batch to the job. Finished jobs
+    are dropped `ttl` seconds after completion, and submit() raises
+    JobQueueFull while `max_pending` jobs are still unfinished.
+    """
+
+    def __init__(self, client, workers=None, ttl=None, max_pending=None, clock=time.monotonic):
+        self.client = client
+        self.ttl = config.SEARCH_JOB_TTL if ttl is None else ttl
+        self.max_pending = max_pending or config.SEARCH_JOB_MAX_PENDING
+        self.clock = clock
+        self._executor = ThreadPoolExecutor(max_workers=workers or config.SEARCH_JOB_WORKERS,
+                                            thread_name_prefix="search-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.rejected = 0
+        self.expired = 0
+
+    def submit(self, origin, destination, date, deadline=None, **kwargs):
+        query = dict(kwargs, origin=origin, destination=destination, date=date)
+        with self._lock:
+            self._prune()
+            pending = sum(1 for job in self._jobs.values() if not job.finished)
+            if pending >= self.max_pending:
+                self.rejected += 1
+                raise JobQueueFull(f"Too many pending search jobs ({pending})")
+            job = SearchJob(uuid.uuid4().hex, query, clock=self.clock)
+            self._jobs[job.id] = job
+            self.submitted += 1
+        self._executor.submit(self._run, job, origin, destination, date, deadline, kwargs)
+        return job
+
+    def _run(self, job, origin, destination, date, deadline, kwargs):
+        job.start()
+        try:
+            result = self.client.complete_search(origin, destination, date, deadline=deadline,
+                                                 on_batch=job.update, **kwargs)
+            job.finish(result)
+        except Exception as e:
+            logger.error(f"Error en el job de búsqueda {job.id}: {str(e)}")
+            job.finish(error=f"Search exception: {str(e)}")
+
+    def get(self, job_id):
+        """Return the job with that id, or None if unknown or expired"""
+        with self._lock:
+            self._prune()
+            return self._jobs.get(job_id)
+
+    def _prune(self):
+        now = self.clock()
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished and now - job.finished_at > self.ttl]
+        for job_id in expired:
+            del self._jobs[job_id]
+        self.expired += len(expired)
+
+    def stats(self):
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+            return {
+                "jobs": len(statuses),
+                "pending": statuses.count(JOB_PENDING),
+                "running": statuses.count(JOB_RUNNING),
+                "complete": statuses.count(JOB_COMPLETE),
+                "failed": statuses.count(JOB_FAILED),
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "expired": self.expired,
+            }
+
+    def shutdown(self, wait=False):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,214 @@
+SECTIONS = ("itineraries", "legs", "segments", "places", "carriers", "agents")
+# Secciones que los batches y el más barato necesitan tras cada poll; el resto
+# (entidades de referencia) solo se fusiona cuando se leen los resultados
+TRACKED_SECTIONS = ("itineraries", "legs")
+REFERENCE_SECTIONS = ("segments", "places", "carriers", "agents")
+ACTION_REPLACED = "RESULT_ACTION_REPLACED"
+
+
+def cheapest_option(itinerary):
+    """Return the pricing option with the lowest amount (None if unpriced)"""
+    priced = [
+        option for option in itinerary.get("pricingOptions", [])
+        if option.get("price", {}).get("amount") is not None
+    ]
+    return min(priced, key=lambda option: float(option["price"]["amount"])) if priced else None
+
+
+def itinerary_price(itinerary):
+    """Return the cheapest pricing option amount of an itinerary (None if unpriced)"""
+    option = cheapest_option(itinerary)
+    return float(option["price"]["amount"]) if option is not None else None
+
+
+def _merge_pricing_options(current, incoming):
+    """Merge pricing options by id, keeping the latest price of each option"""
+    merged = {option.get("id", position): option for position, option in enumerate(current)}
+    for position, option in enumerate(incoming):
+        merged[option.get("id", position)] = option
+    return list(merged.values())
+
+
+class SearchState:
+    """
+    Live search results merged incrementally from successive poll responses.
+
+    Entities of every section (itineraries, legs, segments, places, carriers,
+    agents) are kept by id and updated in place. A RESULT_ACTION_REPLACED
+    response carries the full current results: its entities replace the
+    stored ones, pricing options included, and entities it omits are removed.
+    Other responses are partial and their pricing options are merged by id so
+    the latest price of each option wins. Every merge that changes itineraries
+    or legs bumps `version`; changes_since(version) and removed_since(version)
+    return the entries added, updated or removed after that version.
+
+    Only itineraries and legs are merged as each poll arrives. The reference
+    sections are queued and merged the first time `sections` is read, and a
+    replaced response drops the queue before it, so with a LazySearchResponse
+    the segments, places, carriers and agents of superseded polls are never
+    decoded.
+    """
+
+    def __init__(self):
+        self._sections = {name: {} for name in SECTIONS}
+        self._pending = []  # content.results de respuestas con secciones de referencia sin fusionar
+        self.version = 0
+        self.status = None
+        self.action = None
+        self.session_token = None
+        self.stats = {}
+        self.cheapest = None
+        self.polls = 0
+        self._history = []  # [(version, {section: {changed ids}}, {section: {removed ids}})]
+
+    def merge(self, response):
+        """Merge a create/poll response and return the ids changed per section"""
+        self.polls += 1
+        self.status = response.get("status", self.status)
+        self.action = response.get("action", self.action)
+        self.session_token = response.get("sessionToken", self.session_token)
+
+        content = response.get("content", {})
+        results = content.get("results") or {}
+        if content.get("stats"):
+            self.stats = content["stats"]
+
+        replaced = response.get("action") == ACTION_REPLACED
+        if replaced:
+            # Las respuestas anteriores quedan sustituidas por esta
+            self._pending = [(True, results)]
+        else:
+            self._pending.append((False, results))
+
+        changed = {}
+        removed = {}
+        for name in TRACKED_SECTIONS:
+            incoming = results.get(name) or {}
+            section = self._sections[name]
+            if replaced:
+                # Respuesta completa: lo que no viene ya no existe
+                gone = {entity_id for entity_id in section if entity_id not in incoming}
+                for entity_id in gone:
+                    del section[entity_id]
+                if gone:
+                    removed[name] = gone
+            if not incoming:
+                continue
+            ids = set()
+            for entity_id, entity in incoming.items():
+                current = section.get(entity_id)
+                if current is not None:
+                    if current == entity:
+                        continue
+                    if name == "itineraries" and not replaced:
+                        entity = dict(entity, pricingOptions=_merge_pricing_options(
+                            current.get("pricingOptions", []), entity.get("pricingOptions", [])
+                        ))
+                        if current == entity:
+                            continue
+                section[entity_id] = entity
+                ids.add(entity_id)
+            if ids:
+                changed[name] = ids
+
+        if changed or removed:
+            self.version += 1
+            self._history.append((self.version, changed, removed))
+            self._update_cheapest(changed.get("itineraries", ()), removed.get("itineraries", ()))
+        return changed
+
+    @property
+    def sections(self):
+        """All merged sections by name, merging the queued reference sections first"""
+        if self._pending:
+            pending, self._pending = self._pending, []
+            for replaced, results in pending:
+                for name in REFERENCE_SECTIONS:
+                    incoming = results.get(name) or {}
+                    if replaced:
+                        self._sections[name] = dict(incoming)
+                    else:
+                        self._sections[name].update(incoming)
+        return self._sections
+
+    def _update_cheapest(self, itinerary_ids, removed_ids=()):
+        itineraries = self._sections["itineraries"]
+        candidates = itinerary_ids
+        if self.cheapest and (self.cheapest["itinerary_id"] in itinerary_ids
+                              or self.cheapest["itinerary_id"] in removed_ids):
+            # El más barato ha cambiado de precio o ya no existe: hay que revisar todos
+            candidates = itineraries.keys()
+            self.cheapest = None
+        for itin_id in candidates:
+            price = itinerary_price(itineraries[itin_id])
+            if price is not None and (self.cheapest is None or price < self.cheapest["amount"]):
+                unit = cheapest_option(itineraries[itin_id])["price"].get("unit")
+                self.cheapest = {"itinerary_id": itin_id, "amount": price, "unit": unit}
+
+    def changes_since(self, version=0):
+        """Return {section: {id: entity}} for entries changed after a version"""
+        ids = {}
+        for entry_version, changed, _ in reversed(self._history):
+            if entry_version <= version:
+                break
+            for name, section_ids in changed.items():
+                ids.setdefault(name, set()).update(section_ids)
+        changes = {}
+        for name, section_ids in ids.items():
+            section = self._sections[name]
+            entities = {entity_id: section[entity_id] for entity_id in section_ids if entity_id in section}
+            if entities:
+                changes[name] = entities
+        return changes
+
+    def removed_since(self, version=0):
+        """Return {section: {ids}} of entries removed after a version and not added back"""
+        ids = {}
+        for entry_version, _, removed in reversed(self._history):
+            if entry_version <= version:
+                break
+            for name, section_ids in removed.items():
+                ids.setdefault(name, set()).update(section_ids)
+        removed = {}
+        for name, section_ids in ids.items():
+            gone = {entity_id for entity_id in section_ids if entity_id not in self._sections[name]}
+            if gone:
+                removed[name] = gone
+        return removed
+
+    def batch(self, version=0):
+        """Return the new/updated (with their legs) and removed itineraries since a version, for streaming"""
+        changes = self.changes_since(version)
+        itineraries = changes.get("itineraries", {})
+        removed = self.removed_since(version).get("itineraries", ())
+        legs = self._sections["legs"]
+        return {
+            "status": self.status,
+            "poll": self.polls,
+            "version": self.version,
+            "cheapest": self.cheapest,
+            "itinerary_count": len(self._sections["itineraries"]),
+            "itineraries": itineraries,
+            "removed": sorted(removed),
+            "legs": {
+                leg_id: legs[leg_id]
+                for itin in itineraries.values()
+                for leg_id in itin.get("legIds", [])
+                if leg_id in legs
+            },
+        }
+
+    def itinerary_count(self):
+        return len(self._sections["itineraries"])
+
+    def to_results(self):
+        """Return the merged state shaped like a Skyscanner poll response"""
+        return {
+            "status": self.status,
+            "action": self.action,
+            "sessionToken": self.session_token,
+            "content": {
+                "results": self.sections,
+                "stats": self.stats,
+            },
+        }
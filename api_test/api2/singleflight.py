@@ -0,0 +1,135 @@
+import asyncio
+import threading
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters", "futures")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+        self.futures = []  # (loop, asyncio.Future) of coroutines waiting for the call
+
+    def outcome(self):
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class SingleFlightTimeout(TimeoutError):
+    """Raised to a waiting caller whose wait_timeout ran out before the shared call finished"""
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key into a single execution.
+
+    The first caller for a key runs the function; callers arriving while it is
+    in flight wait for it and receive the same result, or the same exception.
+    Threads and coroutines share the same in-flight calls: do(), do_async()
+    and join()/finish() callers wait for each other's executions, and
+    coroutines wait on their event loop without taking a thread.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+
+    def join(self, key, loop=None):
+        """
+        Return (call, waiter) for a key; waiter is None for the leader.
+
+        The leader must run the work, set call.result or call.error and then
+        call finish(). Threads that join (no loop) wait on call.done; with an
+        event loop the waiter is an asyncio.Future of that loop which finish()
+        resolves, so a coroutine waits without holding a thread.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+                return call, None
+            call.waiters += 1
+            self.coalesced += 1
+            waiter = True
+            if loop is not None:
+                waiter = loop.create_future()
+                call.futures.append((loop, waiter))
+            return call, waiter
+
+    def finish(self, key, call):
+        with self._lock:
+            del self._calls[key]
+            futures, call.futures = call.futures, []
+        call.done.set()
+        for loop, future in futures:
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:
+                pass  # Bucle ya cerrado: nadie espera en él
+
+    def do(self, key, fn, *args, wait_timeout=None, **kwargs):
+        """
+        Run fn(*args, **kwargs) once for all concurrent callers of a key.
+
+        Callers that join a call in flight wait at most `wait_timeout` seconds
+        (forever if None) and then get SingleFlightTimeout; the call goes on.
+        """
+        call, waiter = self.join(key)
+        if waiter is not None:
+            if not call.done.wait(wait_timeout):
+                raise SingleFlightTimeout(f"Shared call still running after {wait_timeout} seconds")
+        else:
+            try:
+                call.result = fn(*args, **kwargs)
+            except BaseException as e:
+                call.error = e
+            finally:
+                self.finish(key, call)
+        return call.outcome()
+
+    async def do_async(self, key, fn, *args, wait_timeout=None, **kwargs):
+        """Like do() for a coroutine function; waiting for another caller does not block the event loop"""
+        call, waiter = self.join(key, asyncio.get_running_loop())
+        if waiter is not None:
+            await wait_async(waiter, wait_timeout)
+        else:
+            try:
+                call.result = await fn(*args, **kwargs)
+            except BaseException as e:
+                call.error = e
+            finally:
+                self.finish(key, call)
+        return call.outcome()
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self):
+        return {
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": self.in_flight(),
+        }
+
+
+async def wait_async(waiter, timeout=None):
+    """
+    Wait on the loop for the future join() returned to a coroutine follower;
+    raise SingleFlightTimeout after `timeout` seconds (forever if None)
+    """
+    try:
+        await asyncio.wait_for(waiter, timeout)
+    except asyncio.TimeoutError:
+        raise SingleFlightTimeout(f"Shared call still running after {timeout} seconds") from None
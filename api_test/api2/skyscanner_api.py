@@ -1,27 +1,154 @@
+import asyncio
 import requests
 import json
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import config
 import logging
+from polling import PollingStrategy, STATUS_COMPLETE, STATUS_INCOMPLETE
+from search_state import SearchState
+from search_cache import make_search_key
+from singleflight import SingleFlight, SingleFlightTimeout
+from itinerary_index import ItineraryIndex, SORT_CHEAPEST
+from lazy_response import LazySearchResponse
+from resilience import TokenBucket, CircuitBreaker, UpstreamUnavailable
+from metrics import UPSTREAM_REQUESTS, UPSTREAM_DURATION, SEARCH_POLLS
 
 # Configuración básica de logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Sesión HTTP compartida entre todas las instancias del cliente (y entre los
+# hilos de Flask) para reutilizar conexiones keep-alive con Skyscanner
+_shared_session = None
+_shared_session_lock = threading.Lock()
+
+
+def create_http_session(pool_connections=None, pool_maxsize=None, max_retries=None):
+    """
+    Create a requests session with a pooled, keep-alive HTTPS adapter
+    """
+    retries = config.HTTP_MAX_RETRIES if max_retries is None else max_retries
+    # Solo se reintentan fallos seguros: errores de conexión (la petición no
+    # llegó a enviarse) y 503 (el servicio la rechazó sin procesarla). Los
+    # errores de lectura, 502 y 504 no se reintentan: upstream puede haber
+    # procesado ya un "create", que no es idempotente.
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=0,
+        status=retries,
+        status_forcelist=(503,),
+        allowed_methods=frozenset(["GET", "POST"]),
+        backoff_factor=config.HTTP_RETRY_BACKOFF,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections or config.HTTP_POOL_CONNECTIONS,
+        pool_maxsize=pool_maxsize or config.HTTP_POOL_MAXSIZE,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_shared_session():
+    """
+    Return the process-wide pooled session, creating it on first use
+    """
+    global _shared_session
+    if _shared_session is None:
+        with _shared_session_lock:
+            if _shared_session is None:
+                _shared_session = create_http_session()
+    return _shared_session
+
+
+# Todo el tráfico comparte la misma API key: limitador y circuit breaker son
+# también compartidos por todas las instancias del cliente
+_shared_rate_limiter = TokenBucket()
+_shared_circuit_breaker = CircuitBreaker()
+
+
 class SkyscannerApiClient:
-    def __init__(self):
+    def __init__(self, session=None, connect_timeout=None, read_timeout=None, cache=None,
+                 singleflight=None, indicative_cache=None, rate_limiter=None, circuit_breaker=None,
+                 base_url=None):
         self.api_key = config.API_KEY
-        self.base_url = config.API_BASE_URL
+        self.base_url = base_url or config.API_BASE_URL
         self.version = config.API_VERSION
         self.headers = {
             "x-api-key": self.api_key,
             "Content-Type": "application/json"
         }
+        # El pool de conexiones es thread-safe; por defecto se comparte entre clientes
+        self.session = session or get_shared_session()
+        self.timeout = (
+            connect_timeout or config.HTTP_CONNECT_TIMEOUT,
+            read_timeout or config.HTTP_READ_TIMEOUT,
+        )
+        # Caché opcional de búsquedas completas (search_cache.SearchCache)
+        self.cache = cache
+        # Búsquedas idénticas concurrentes comparten una única búsqueda upstream
+        self.singleflight = singleflight or SingleFlight()
+        # Revalidación en segundo plano de resultados caducados (stale-while-revalidate)
+        self._revalidator = None
+        self._revalidating = set()
+        self._revalidate_lock = threading.Lock()
+        self.revalidations = 0
+        # Caché opcional de precios indicativos por (ruta, día)
+        self.indicative_cache = indicative_cache
+        # Protección de la API key: limitador de peticiones y circuit breaker
+        self.rate_limiter = rate_limiter or _shared_rate_limiter
+        self.circuit_breaker = circuit_breaker or _shared_circuit_breaker
     
     def _get_flights_url(self, endpoint):
         return f"{self.base_url}/{self.version}/flights/live/{endpoint}"
     
+    def _post(self, url, payload=None, timeout=None, endpoint="other"):
+        """
+        Send a POST request through the pooled session.
+
+        Requests fail fast with UpstreamUnavailable while the circuit is open
+        or when no rate-limit token arrives in time; 429/5xx responses and
+        transport errors count as circuit breaker failures. Latency and
+        status are recorded in the upstream metrics under `endpoint`.
+        """
+        if self.circuit_breaker.fail_fast():
+            UPSTREAM_REQUESTS.labels(endpoint, "rejected").inc()
+            raise UpstreamUnavailable("Circuit breaker open: upstream failing, request not sent")
+        # El circuito se consulta antes de gastar (o esperar) un token
+        if not self.circuit_breaker.allow_request():
+            UPSTREAM_REQUESTS.labels(endpoint, "rejected").inc()
+            raise UpstreamUnavailable("Circuit breaker half-open: probe already in flight")
+        if not self.rate_limiter.acquire():
+            self.circuit_breaker.release_probe()
+            UPSTREAM_REQUESTS.labels(endpoint, "rejected").inc()
+            raise UpstreamUnavailable("Client-side rate limit exceeded, request not sent")
+        
+        started = time.perf_counter()
+        try:
+            response = self.session.post(url, headers=self.headers, json=payload, timeout=timeout or self.timeout)
+        except Exception:
+            UPSTREAM_DURATION.labels(endpoint).observe(time.perf_counter() - started)
+            UPSTREAM_REQUESTS.labels(endpoint, "error").inc()
+            self.circuit_breaker.record_failure()
+            raise
+        UPSTREAM_DURATION.labels(endpoint).observe(time.perf_counter() - started)
+        UPSTREAM_REQUESTS.labels(endpoint, str(response.status_code)).inc()
+        
+        if response.status_code == 429 or response.status_code >= 500:
+            self.circuit_breaker.record_failure()
+        else:
+            self.circuit_breaker.record_success()
+        return response
+    
     def search_flights(self, origin, destination, date, adults=1, children_ages=None, 
                       market=config.DEFAULT_MARKET, locale=config.DEFAULT_LOCALE, 
                       currency=config.DEFAULT_CURRENCY, cabin_class="CABIN_CLASS_ECONOMY"):
@@ -60,7 +187,7 @@ class SkyscannerApiClient:
         logger.info(f"Buscando vuelos: {origin} → {destination}, fecha: {date}")
         
         try:
-            response = requests.post(url, headers=self.headers, json=query)
+            response = self._post(url, payload=query, endpoint="create")
             
             if response.status_code == 200:
                 result = response.json()
@@ -82,9 +209,58 @@ class SkyscannerApiClient:
             logger.exception("Error durante la petición de búsqueda")
             return {"error": f"Request exception: {str(e)}"}
     
-    def poll_search_results(self, session_token):
+    def get_indicative_prices(self, origin, destination, start_date, end_date,
+                              market=config.DEFAULT_MARKET, locale=config.DEFAULT_LOCALE,
+                              currency=config.DEFAULT_CURRENCY):
+        """
+        Get indicative (cached) prices for every day between two dates in one request
+        """
+        url = f"{self.base_url}/{self.version}/flights/indicative/search"
+        start = datetime.strptime(start_date, "%Y-%m-%d") if isinstance(start_date, str) else start_date
+        end = datetime.strptime(end_date, "%Y-%m-%d") if isinstance(end_date, str) else end_date
+        
+        # La API agrupa por meses: se pide el rango de meses y se filtra por día después
+        query = {
+            "query": {
+                "market": market,
+                "locale": locale,
+                "currency": currency,
+                "queryLegs": [
+                    {
+                        "originPlace": {"queryPlace": {"iata": origin}},
+                        "destinationPlace": {"queryPlace": {"iata": destination}},
+                        "dateRange": {
+                            "startDate": {"year": start.year, "month": start.month},
+                            "endDate": {"year": end.year, "month": end.month}
+                        }
+                    }
+                ],
+                "dateTimeGroupingType": "DATE_TIME_GROUPING_TYPE_BY_DATE"
+            }
+        }
+        
+        logger.info(f"Precios indicativos: {origin} → {destination}, {start:%Y-%m-%d} a {end:%Y-%m-%d}")
+        
+        try:
+            response = self._post(url, payload=query, endpoint="indicative")
+            
+            if response.status_code == 200:
+                return response.json()
+            else:
+                logger.error(f"Error en precios indicativos: {response.status_code}, {response.text}")
+                return {"error": f"Indicative request failed with status code {response.status_code}: {response.text}"}
+                
+        except Exception as e:
+            logger.exception("Error durante la petición de precios indicativos")
+            return {"error": f"Indicative request exception: {str(e)}"}
+    
+    def poll_search_results(self, session_token, timeout=None, lazy=False):
         """
         Poll for complete search results
+
+        With lazy=True a successful poll is returned as a LazySearchResponse,
+        which keeps the raw body and only decodes the sections that are
+        accessed; the poll loop merges it into its SearchState directly.
         """
         # No modificar el token - usar exactamente como viene de la API
         url = self._get_flights_url(f"search/poll/{session_token}")
@@ -92,10 +268,12 @@ class SkyscannerApiClient:
         
         try:
             # Solo usar los headers básicos, sin añadir el token como header
-            response = requests.post(url, headers=self.headers)
+            response = self._post(url, timeout=timeout, endpoint="poll")
             
             if response.status_code == 200:
                 logger.info(f"Polling exitoso con status code: {response.status_code}")
+                if lazy:
+                    return LazySearchResponse(response.content)
                 return response.json()
             else:
                 logger.error(f"Error en polling: {response.status_code}, {response.text}")
@@ -105,54 +283,256 @@ class SkyscannerApiClient:
             logger.exception("Error durante el polling")
             return {"error": f"Polling exception: {str(e)}"}
     
-    def complete_search(self, origin, destination, date, **kwargs):
+    def _iter_states(self, origin, destination, date, deadline=None, **kwargs):
         """
-        Complete a flight search, polling until results are complete
+        Run a live search and yield its SearchState after the create and every poll.
+
+        Polls follow an adaptive schedule (see polling.PollingStrategy) bounded
+        by `deadline` seconds, and each response is merged into the same state
+        instead of replacing the previous one. An error dict is yielded only if
+        no itineraries were received before the error.
         """
+        strategy = PollingStrategy(deadline=deadline)
+        
         # Realizar búsqueda inicial
         search_response = self.search_flights(origin, destination, date, **kwargs)
         
         if "error" in search_response:
             logger.error(f"Error en búsqueda inicial: {search_response['error']}")
-            return search_response
+            yield search_response
+            return
         
         session_token = search_response["session_token"]
-        results = search_response["results"]
-        
-        # Verificar si necesitamos hacer polling
-        status = results.get("status")
+        state = SearchState()
+        state.merge(search_response["results"])
+        strategy.observe(search_response["results"])
+        yield state
         
-        if status != "RESULT_STATUS_COMPLETE":
-            # Esperar un poco antes de empezar polling
-            time.sleep(2)
+        while state.status == STATUS_INCOMPLETE and not strategy.expired():
+            time.sleep(strategy.next_wait())
+            if strategy.expired():
+                break
             
-            # Poll for complete results
-            poll_attempts = 0
-            max_polls = 3  # Reducir a 3 intentos como en tu script de ejemplo
+            logger.info(f"Intento de polling #{strategy.polls}")
+            poll_response = self.poll_search_results(session_token, timeout=self._deadline_timeout(strategy),
+                                                     lazy=True)
             
-            while status == "RESULT_STATUS_INCOMPLETE" and poll_attempts < max_polls:
-                poll_attempts += 1
-                logger.info(f"Intento de polling #{poll_attempts}")
-                
-                poll_response = self.poll_search_results(session_token)
-                
-                if "error" not in poll_response:
-                    status = poll_response.get("status")
-                    results = poll_response
-                    logger.info(f"Polling exitoso, estado: {status}")
-                    
-                    # Si la búsqueda está completa, terminar
-                    if status == "RESULT_STATUS_COMPLETE":
-                        break
-                else:
-                    logger.error(f"Error en polling: {poll_response['error']}")
-                    return poll_response
-                
-                # Esperar entre intentos como en tu script (2 segundos)
-                time.sleep(2)
+            if "error" in poll_response:
+                logger.error(f"Error en polling: {poll_response['error']}")
+                if not state.itinerary_count():
+                    yield poll_response
+                # Si ya hay resultados parciales, se conservan en lugar del error
+                return
+            
+            state.merge(poll_response)
+            strategy.observe(poll_response)
+            logger.info(f"Polling exitoso, estado: {state.status}")
+            yield state
+        
+        if state.status != STATUS_COMPLETE:
+            logger.warning(f"Búsqueda {origin} → {destination} sin completar tras {strategy.polls} polls; "
+                           f"devolviendo {state.itinerary_count()} itinerarios parciales")
+    
+    def complete_search(self, origin, destination, date, deadline=None, on_batch=None, **kwargs):
+        """
+        Complete a flight search, polling until results are complete.
+
+        If the deadline runs out, or a poll fails after some results were
+        received, the best partial results are returned. When the client has a
+        cache, complete results are served from and stored into it. Identical
+        concurrent searches wait for one shared upstream search and receive
+        its result (or its error).
         
+        on_batch, if given, is called with every SearchState.batch of the
+        upstream search this call runs (not for cached or coalesced results).
+        """
+        key = make_search_key(origin, destination, date, **kwargs)
+        cached = self._cache_get(key)
+        if cached is not None:
+            logger.info(f"Resultados de {origin} → {destination} servidos desde la caché")
+            return cached
+        
+        return self._shared_search(key, origin, destination, date, deadline=deadline, on_batch=on_batch, **kwargs)
+    
+    def serve_search(self, origin, destination, date, deadline=None, **kwargs):
+        """
+        Stale-while-revalidate variant of complete_search.
+
+        Returns (results, cache_status, age). Cached results older than the
+        cache TTL but within its hard TTL are returned at once with status
+        "STALE" while a background refresh replaces them; fresh entries are
+        "HIT" and everything else runs a normal search and is a "MISS" (age 0).
+        """
+        key = make_search_key(origin, destination, date, **kwargs)
+        if self.cache is not None:
+            cached, age = self.cache.lookup(key)
+            if cached is not None:
+                if age > self.cache.ttl:
+                    self._schedule_revalidation(key, origin, destination, date, **kwargs)
+                    return cached, "STALE", age
+                return cached, "HIT", age
+        
+        results = self._shared_search(key, origin, destination, date, deadline=deadline, **kwargs)
+        return results, "MISS", 0
+    
+    def _shared_search(self, key, origin, destination, date, deadline=None, **kwargs):
+        """
+        Run _run_search through the SingleFlight. A caller that joins an identical
+        search still honours its own deadline: once it runs out it gets stale
+        cached results or an error, while the shared search carries on.
+        """
+        wait_timeout = config.SEARCH_DEADLINE if deadline is None else deadline
+        try:
+            return self.singleflight.do(key, self._run_search, key, origin, destination, date,
+                                        wait_timeout=wait_timeout, deadline=deadline, **kwargs)
+        except SingleFlightTimeout:
+            stale = self._cache_get_stale(key)
+            if stale is not None:
+                logger.warning(f"Sirviendo resultados caducados de {origin} → {destination}: "
+                               f"la búsqueda compartida supera el deadline")
+                return stale
+            return {"error": "Search deadline exceeded while waiting for an identical search in progress"}
+    
+    def _schedule_revalidation(self, key, origin, destination, date, **kwargs):
+        with self._revalidate_lock:
+            # Una sola actualización pendiente por búsqueda
+            if key in self._revalidating:
+                return
+            self._revalidating.add(key)
+            if self._revalidator is None:
+                self._revalidator = ThreadPoolExecutor(max_workers=config.REVALIDATE_WORKERS,
+                                                       thread_name_prefix="search-revalidate")
+        self._revalidator.submit(self._revalidate, key, origin, destination, date, **kwargs)
+    
+    def _revalidate(self, key, origin, destination, date, **kwargs):
+        try:
+            # Comparte búsqueda upstream con peticiones interactivas idénticas
+            results = self.singleflight.do(key, self._run_search, key, origin, destination, date, **kwargs)
+            if results.get("status") == STATUS_COMPLETE:
+                self.revalidations += 1
+                logger.info(f"Resultados caducados de {origin} → {destination} actualizados en segundo plano")
+            else:
+                logger.warning(f"No se pudieron actualizar los resultados de {origin} → {destination}")
+        except Exception as e:
+            logger.error(f"Error actualizando resultados de {origin} → {destination}: {str(e)}")
+        finally:
+            with self._revalidate_lock:
+                self._revalidating.discard(key)
+    
+    def revalidation_stats(self):
+        """Return background revalidation counters"""
+        with self._revalidate_lock:
+            return {
+                "revalidations": self.revalidations,
+                "revalidating": len(self._revalidating),
+            }
+    
+    def _run_search(self, key, origin, destination, date, deadline=None, on_batch=None, refresh=False, **kwargs):
+        # Otra búsqueda idéntica puede haber llenado la caché mientras tanto;
+        # el llamante ya contó el acierto o fallo de esta consulta.
+        # Con refresh (precalentamiento) se busca siempre y un error no se
+        # sustituye por datos caducados: la entrada anterior sigue en la caché
+        cached = None if refresh else self._cache_peek(key)
+        if cached is not None:
+            return cached
+        
+        state = None
+        version = 0
+        for state in self._iter_states(origin, destination, date, deadline=deadline, **kwargs):
+            if on_batch is not None and isinstance(state, SearchState) and state.version != version:
+                on_batch(state.batch(version))
+                version = state.version
+        
+        if isinstance(state, SearchState):
+            SEARCH_POLLS.observe(state.polls)
+        results = state.to_results() if isinstance(state, SearchState) else state
+        if "error" in results and not refresh:
+            stale = self._cache_get_stale(key)
+            if stale is not None:
+                # Upstream degradado: mejor datos antiguos que un error
+                logger.warning(f"Sirviendo resultados caducados de {origin} → {destination}: {results['error']}")
+                return stale
+        self._cache_set(key, results)
         return results
     
+    def _cache_get(self, key):
+        if self.cache is None:
+            return None
+        return self.cache.get(key)
+    
+    def _cache_peek(self, key):
+        if self.cache is None:
+            return None
+        return self.cache.peek(key)
+    
+    def _cache_get_stale(self, key):
+        if self.cache is None:
+            return None
+        return self.cache.get_stale(key)
+    
+    def _cache_set(self, key, results):
+        # Solo se guardan búsquedas completas
+        if self.cache is not None and results and results.get("status") == STATUS_COMPLETE:
+            self.cache.set(key, results)
+    
+    def iter_search(self, origin, destination, date, deadline=None, **kwargs):
+        """
+        Run a live search and yield batches of new or updated itineraries as polls arrive.
+
+        Each batch (see SearchState.batch) holds "status", "poll", "version",
+        "cheapest", "itinerary_count", the changed "itineraries" with their
+        "legs" and the ids of "removed" itineraries; a failed search yields a
+        single error dict.
+        """
+        version, status = 0, None
+        for state in self._iter_states(origin, destination, date, deadline=deadline, **kwargs):
+            if not isinstance(state, SearchState):
+                yield state
+                return
+            if state.version != version or state.status != status:
+                yield state.batch(version)
+                version, status = state.version, state.status
+    
+    def _deadline_timeout(self, strategy):
+        """Shorten the read timeout so a single request cannot overrun the search deadline"""
+        connect_timeout, read_timeout = self.timeout
+        return (connect_timeout, max(0.1, min(read_timeout, strategy.remaining())))
+    
+    def search_many(self, routes, max_in_flight=None, deadline=None, max_concurrency=None):
+        """
+        Run several complete searches concurrently and return their results in order.
+
+        Identical routes are searched once; see AsyncSkyscannerApiClient.search_many
+        for the shared deadline and concurrency cap.
+        """
+        # Import diferido para evitar la importación circular con el cliente asyncio
+        from async_skyscanner_api import AsyncSkyscannerApiClient
+
+        async_client = AsyncSkyscannerApiClient(self, max_in_flight=max_in_flight)
+        return asyncio.run(async_client.search_many(routes, deadline=deadline, max_concurrency=max_concurrency))
+    
+    def indicative_price_matrix(self, origins, destinations, start_date, end_date, max_in_flight=None, **kwargs):
+        """
+        Price every origin × destination × day combination concurrently (see price_matrix)
+        """
+        # Import diferido para evitar la importación circular con el cliente asyncio
+        from async_skyscanner_api import AsyncSkyscannerApiClient
+        from price_matrix import build_price_matrix
+
+        async_client = AsyncSkyscannerApiClient(self, max_in_flight=max_in_flight)
+        return asyncio.run(build_price_matrix(async_client, origins, destinations, start_date, end_date, **kwargs))
+    
+    def cheapest_days(self, origin, destination, start_date, end_date, confirm=3, max_in_flight=None, **kwargs):
+        """
+        Find the cheapest departure days of a route within a date window (see price_matrix)
+        """
+        from async_skyscanner_api import AsyncSkyscannerApiClient
+        from price_matrix import find_cheapest_days
+
+        async_client = AsyncSkyscannerApiClient(self, max_in_flight=max_in_flight)
+        return asyncio.run(find_cheapest_days(async_client, origin, destination, start_date, end_date,
+                                              confirm=confirm, **kwargs))
+    
     def get_destination_info(self, destination_iata):
         """
         Get information about a destination
@@ -182,39 +562,28 @@ class SkyscannerApiClient:
         
         output.append(f"\nSe encontraron {len(itineraries)} itinerarios:")
         
-        # Ordenar por precio (menor a mayor)
-        sorted_itineraries = []
-        for itin_id, itin in itineraries.items():
-            pricing = itin.get("pricingOptions", [])
-            if pricing:
-                price = min([p.get("price", {}).get("amount", float('inf')) for p in pricing])
-                sorted_itineraries.append((itin_id, itin, price))
-        
-        sorted_itineraries.sort(key=lambda x: x[2])
+        # Índice columnar: una sola pasada sobre los itinerarios y selección top-k por precio
+        index = ItineraryIndex.from_results(results)
+        legs = index.legs
         
         # Mostrar los primeros 5 itinerarios (los más baratos)
-        for itin_id, itin, _ in sorted_itineraries[:5]:
+        for row in index.top_k(5, SORT_CHEAPEST):
             output.append("-" * 40)
             
             # Precio
-            pricing = itin.get("pricingOptions", [])
-            if pricing:
-                cheapest = min(pricing, key=lambda x: x.get("price", {}).get("amount", float('inf')))
-                price = cheapest.get("price", {})
-                price_amount = price.get("amount", "N/A")
-                price_currency = price.get("unit", "EUR")
-                output.append(f"Precio: {price_amount} {price_currency}")
-                
-                # Agentes
-                agents = cheapest.get("agentIds", [])
-                if agents:
-                    output.append(f"Agencias: {', '.join(agents)}")
+            cheapest = index.cheapest_options[row]
+            price = cheapest.get("price", {})
+            price_amount = price.get("amount", "N/A")
+            price_currency = price.get("unit", "EUR")
+            output.append(f"Precio: {price_amount} {price_currency}")
             
-            # Info del vuelo
-            leg_ids = itin.get("legIds", [])
-            legs = results.get("content", {}).get("results", {}).get("legs", {})
+            # Agentes
+            agents = index.agent_ids[row]
+            if agents:
+                output.append(f"Agencias: {', '.join(agents)}")
             
-            for leg_id in leg_ids:
+            # Info del vuelo
+            for leg_id in index.leg_ids[row]:
                 if leg_id in legs:
                     leg = legs[leg_id]
                     origin = leg.get("originPlaceId", "")
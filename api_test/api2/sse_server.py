@@ -0,0 +1,266 @@
+import argparse
+import asyncio
+import json
+import logging
+import threading
+from urllib.parse import urlsplit, parse_qs
+import config
+from async_skyscanner_api import AsyncSkyscannerApiClient, results_batch
+from search_cache import make_search_key
+from polling import parse_deadline, parse_passengers
+from search_state import itinerary_price
+
+logger = logging.getLogger(__name__)
+
+STREAM_PATH = "/api/search/stream"
+MAX_HEADER_BYTES = 16384
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            503: "Service Unavailable"}
+
+
+def format_event(event, data, event_id=None):
+    """Encode one Server-Sent Event"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return ("\n".join(lines) + "\n\n").encode("utf-8")
+
+
+def parse_query(query_string):
+    """
+    Read the search parameters of a stream request, or raise ValueError
+    """
+    params = {name: values[-1] for name, values in parse_qs(query_string).items()}
+    if not all(params.get(name) for name in ("origin", "destination", "date")):
+        raise ValueError("Missing required parameters")
+    adults, children_ages = parse_passengers(
+        params.get("adults"), params["children_ages"].split(",") if params.get("children_ages") else None
+    )
+    query = {
+        "origin": params["origin"],
+        "destination": params["destination"],
+        "date": params["date"],
+        "adults": adults,
+    }
+    if children_ages:
+        query["children_ages"] = children_ages
+    if params.get("deadline"):
+        query["deadline"] = parse_deadline(params["deadline"])
+    return query
+
+
+def _by_price(itineraries):
+    # Itinerarios sin precio al final
+    return dict(sorted(
+        itineraries.items(),
+        key=lambda item: (itinerary_price(item[1]) is None, itinerary_price(item[1]) or 0.0)
+    ))
+
+
+def batch_events(batch, previous_status=None, previous_cheapest=None):
+    """
+    Turn a SearchState.batch into (event, data) pairs, cheapest first.
+
+    A "cheapest" event with the cheapest itinerary and its legs precedes the
+    "itineraries" event whenever the cheapest-so-far changes, so clients can
+    render a price before the rest of the batch; a "status" event reports
+    status changes. The "itineraries" event also lists the ids of itineraries
+    removed by a full (RESULT_ACTION_REPLACED) response.
+    """
+    events = []
+    cheapest = batch.get("cheapest")
+    if cheapest and cheapest != previous_cheapest:
+        itinerary = batch["itineraries"].get(cheapest["itinerary_id"])
+        events.append(("cheapest", {
+            "cheapest": cheapest,
+            "itinerary": itinerary,
+            "legs": {leg_id: batch["legs"][leg_id]
+                     for leg_id in (itinerary or {}).get("legIds", []) if leg_id in batch["legs"]},
+        }))
+    if batch["status"] != previous_status:
+        events.append(("status", {"status": batch["status"], "poll": batch["poll"]}))
+    if batch["itineraries"] or batch.get("removed"):
+        events.append(("itineraries", {
+            "version": batch["version"],
+            "poll": batch["poll"],
+            "itinerary_count": batch["itinerary_count"],
+            "itineraries": _by_price(batch["itineraries"]),
+            "removed": batch.get("removed", []),
+            "legs": batch["legs"],
+        }))
+    return events
+
+
+class SearchStreamServer:
+    """
+    Minimal asyncio HTTP server streaming live searches as Server-Sent Events.
+
+    GET /api/search/stream?origin=MAD&destination=BCN&date=2024-12-25 pushes
+    "cheapest", "status" and "itineraries" events as each upstream poll
+    arrives, then a final "complete" (or "error") event, and closes. All
+    streams share one event loop: waits between polls are asyncio sleeps and
+    only the HTTP calls themselves borrow an executor thread, so an open
+    stream does not pin an OS thread. Streams for a search that is already
+    running (from another stream or a Flask request) wait for it and receive
+    its results in one batch.
+    """
+
+    def __init__(self, async_client=None, max_streams=None, keepalive=None):
+        self.client = async_client or AsyncSkyscannerApiClient()
+        self.max_streams = max_streams or config.SSE_MAX_STREAMS
+        self.keepalive = keepalive or config.SSE_KEEPALIVE
+        self.open_streams = 0
+        self.streams_served = 0
+        self.rejected = 0
+
+    async def handle(self, reader, writer):
+        try:
+            try:
+                head = await reader.readuntil(b"\r\n\r\n")
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                return
+            request_line = head.split(b"\r\n", 1)[0].decode("latin-1")
+            parts = request_line.split(" ")
+            if len(parts) != 3:
+                await self._reply(writer, 400, {"error": "Malformed request"})
+                return
+            method, target, _ = parts
+            url = urlsplit(target)
+            if url.path != STREAM_PATH:
+                await self._reply(writer, 404, {"error": "Not found"})
+                return
+            if method != "GET":
+                await self._reply(writer, 405, {"error": "Method not allowed"})
+                return
+            try:
+                query = parse_query(url.query)
+            except ValueError as e:
+                await self._reply(writer, 400, {"error": str(e)})
+                return
+            if self.open_streams >= self.max_streams:
+                self.rejected += 1
+                await self._reply(writer, 503, {"error": "Too many open streams"})
+                return
+
+            self.open_streams += 1
+            self.streams_served += 1
+            try:
+                await self._stream(writer, query)
+            finally:
+                self.open_streams -= 1
+        except (ConnectionError, asyncio.CancelledError):
+            logger.info("Cliente SSE desconectado")
+        finally:
+            writer.close()
+
+    async def _reply(self, writer, status, body):
+        payload = json.dumps(body).encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status} {_REASONS[status]}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            "Connection: close\r\n\r\n".encode("latin-1") + payload
+        )
+        await writer.drain()
+
+    async def _stream(self, writer, query):
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Cache-Control: no-cache\r\n"
+            b"Access-Control-Allow-Origin: *\r\n"
+            b"Connection: close\r\n\r\n"
+        )
+        await writer.drain()
+
+        # La búsqueda avanza en otra tarea para poder enviar keep-alives mientras espera
+        events = asyncio.Queue()
+        producer = asyncio.create_task(self._produce(query, events))
+        event_id = 0
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(events.get(), timeout=self.keepalive)
+                except asyncio.TimeoutError:
+                    writer.write(b": keepalive\n\n")
+                    await writer.drain()
+                    continue
+                if item is None:
+                    return
+                event_id += 1
+                writer.write(format_event(item[0], item[1], event_id))
+                await writer.drain()
+        finally:
+            producer.cancel()
+
+    async def _produce(self, query, events):
+        params = dict(query)
+        origin, destination, date = params.pop("origin"), params.pop("destination"), params.pop("date")
+        deadline = params.pop("deadline", None)
+        status, cheapest, count = None, None, 0
+        try:
+            cached = self.client.sync_client._cache_get(make_search_key(origin, destination, date, **params))
+            batches = [results_batch(cached)] if cached is not None else None
+            if batches is None:
+                batches = self.client.aiter_search(origin, destination, date, deadline=deadline, **params)
+            else:
+                batches = _aiter(batches)
+
+            async for batch in batches:
+                if "error" in batch:
+                    await events.put(("error", {"error": batch["error"]}))
+                    return
+                for event in batch_events(batch, status, cheapest):
+                    await events.put(event)
+                status, cheapest, count = batch["status"], batch["cheapest"], batch["itinerary_count"]
+
+            await events.put(("complete", {"status": status, "itinerary_count": count, "cheapest": cheapest}))
+        except Exception as e:
+            logger.exception("Error durante la búsqueda en streaming")
+            await events.put(("error", {"error": f"Search exception: {str(e)}"}))
+        finally:
+            await events.put(None)
+
+    def stats(self):
+        return {
+            "open_streams": self.open_streams,
+            "streams_served": self.streams_served,
+            "rejected": self.rejected,
+        }
+
+    async def serve(self, host=None, port=None):
+        server = await asyncio.start_server(
+            self.handle, host or config.SSE_HOST, port or config.SSE_PORT, limit=MAX_HEADER_BYTES
+        )
+        logger.info(f"Streaming SSE escuchando en {host or config.SSE_HOST}:{port or config.SSE_PORT}")
+        async with server:
+            await server.serve_forever()
+
+
+async def _aiter(items):
+    for item in items:
+        yield item
+
+
+def start_in_thread(async_client=None, host=None, port=None):
+    """
+    Run a SearchStreamServer on its own event loop in one daemon thread
+    """
+    server = SearchStreamServer(async_client)
+    thread = threading.Thread(target=asyncio.run, args=(server.serve(host, port),),
+                              name="sse-server", daemon=True)
+    thread.start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Servidor SSE de búsquedas de vuelos en streaming')
+    parser.add_argument('--host', default=config.SSE_HOST, help=f'Host (default: {config.SSE_HOST})')
+    parser.add_argument('--port', type=int, default=config.SSE_PORT, help=f'Puerto (default: {config.SSE_PORT})')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(SearchStreamServer().serve(args.host, args.port))
@@ -0,0 +1,105 @@
+import asyncio
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+import config
+from async_skyscanner_api import AsyncSkyscannerApiClient
+from benchmark import FakeTransport, make_client, no_poll_waits
+from singleflight import SingleFlight, SingleFlightTimeout
+
+
+class SingleFlightTest(unittest.TestCase):
+
+    def test_threads_share_one_execution(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def work():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return "result"
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            leader = pool.submit(flight.do, "key", work)
+            started.wait(5)
+            followers = [pool.submit(flight.do, "key", work) for _ in range(3)]
+            time.sleep(0.05)
+            release.set()
+            results = [leader.result(5)] + [future.result(5) for future in followers]
+
+        self.assertEqual(results, ["result"] * 4)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.stats()["coalesced"], 3)
+
+    def test_follower_wait_timeout(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        leader = threading.Thread(target=flight.do, args=("key", lambda: release.wait(5)))
+        leader.start()
+        while not flight.in_flight():
+            time.sleep(0.01)
+        try:
+            with self.assertRaises(SingleFlightTimeout):
+                flight.do("key", lambda: None, wait_timeout=0.05)
+        finally:
+            release.set()
+            leader.join()
+
+    def test_async_followers_do_not_hold_threads(self):
+        flight = SingleFlight()
+        release = threading.Event()
+
+        async def main():
+            loop = asyncio.get_running_loop()
+            # Un único hilo en el executor: si un seguidor lo ocupase, el líder no terminaría
+            loop.set_default_executor(ThreadPoolExecutor(max_workers=1))
+
+            async def lead():
+                await asyncio.to_thread(release.wait, 5)
+                return "result"
+
+            leader = asyncio.ensure_future(flight.do_async("key", lead))
+            await asyncio.sleep(0.01)
+            followers = [asyncio.ensure_future(flight.do_async("key", lead)) for _ in range(10)]
+            await asyncio.sleep(0.01)
+            release.set()
+            return await asyncio.wait_for(asyncio.gather(leader, *followers), 5)
+
+        self.assertEqual(asyncio.run(main()), ["result"] * 11)
+
+
+class AiterSearchCoalescingTest(unittest.TestCase):
+
+    def test_more_followers_than_executor_threads(self):
+        # Regresión: cada stream que se unía a una búsqueda ocupaba un hilo del
+        # executor por defecto y, con más seguidores que hilos, el líder no avanzaba
+        workers = 2
+        followers = workers * 3
+        transport = FakeTransport(itineraries=20, polls_to_complete=2, latency=0.02)
+        client = AsyncSkyscannerApiClient(make_client(transport))
+
+        async def stream():
+            return [batch async for batch in client.aiter_search("MAD", "BCN", "2024-01-15", deadline=10)]
+
+        async def main():
+            asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=workers))
+            leader = asyncio.ensure_future(stream())
+            await asyncio.sleep(0)
+            return await asyncio.wait_for(asyncio.gather(leader, *(stream() for _ in range(followers))), 5)
+
+        with no_poll_waits():
+            config.POLL_FIRST_WAIT = 0.05
+            streams = asyncio.run(main())
+
+        self.assertEqual(transport._counter, 1)
+        for batches in streams:
+            self.assertEqual(batches[-1]["status"], "RESULT_STATUS_COMPLETE")
+            self.assertEqual(batches[-1]["itinerary_count"], 20)
+
+
+if __name__ == '__main__':
+    unittest.main()